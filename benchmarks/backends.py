@@ -0,0 +1,72 @@
+"""
+Compares the raw file backends (see `pollyxt_pipelines.polly_to_scc.backends`) on building the
+repository index and on reading whole intervals.
+
+Usage:
+    python benchmarks/backends.py <path to raw files> [interval in minutes] [repeats]
+"""
+
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from pollyxt_pipelines.polly_to_scc import pollyxt
+from pollyxt_pipelines.polly_to_scc.backends import BACKENDS, get_backend
+from pollyxt_pipelines.polly_to_scc.prefetch import ReadTask, read_task
+
+
+def build_index(path: Path, backend) -> float:
+    """Time building the index without the cache"""
+
+    start = time.perf_counter()
+    repository = pollyxt.PollyXTRepository(path, use_cache=False, backend=backend)
+    elapsed = time.perf_counter() - start
+    repository.close()
+    return elapsed
+
+
+def read_intervals(path: Path, backend, interval: timedelta, channels=None) -> float:
+    """Time reading every interval of the repository"""
+
+    with pollyxt.PollyXTRepository(path, use_cache=False, backend=backend) as repo:
+        first, last = repo.get_time_period()
+        start = time.perf_counter()
+        while first <= last:
+            slices = repo.find_slices(first, first + interval)
+            if len(slices) > 0:
+                read_task(
+                    ReadTask(first, first + interval, slices, channels), repo.pool
+                )
+            first += interval
+        return time.perf_counter() - start
+
+
+def main():
+    path = Path(sys.argv[1])
+    interval = timedelta(minutes=int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    table = Table(title=f"{path} (best of {repeats})")
+    table.add_column("Backend")
+    table.add_column("Index", justify="right")
+    table.add_column("Intervals (all channels)", justify="right")
+    table.add_column("Intervals (channels 0, 2, 5)", justify="right")
+
+    for name in BACKENDS:
+        backend = get_backend(name)
+        index = min(build_index(path, backend) for _ in range(repeats))
+        full = min(read_intervals(path, backend, interval) for _ in range(repeats))
+        subset = min(
+            read_intervals(path, backend, interval, [0, 2, 5]) for _ in range(repeats)
+        )
+        table.add_row(name, f"{index:.3f}s", f"{full:.3f}s", f"{subset:.3f}s")
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares reading raw files as masked arrays (the `netCDF4` default) with reading them as plain
+arrays (see `pollyxt_pipelines.polly_to_scc.backends`), on building the repository index and on
+reading every interval and converting it to float64 like the SCC writer does.
+
+Meant to be run on a day of data.
+
+Usage:
+    python benchmarks/masked_reads.py <path to raw files> [interval in minutes] [repeats]
+"""
+
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from pollyxt_pipelines.polly_to_scc import pollyxt
+from pollyxt_pipelines.polly_to_scc.backends import NetCDF4Backend
+from pollyxt_pipelines.polly_to_scc.prefetch import ReadTask, read_task
+from pollyxt_pipelines.polly_to_scc.scc_netcdf import raw_signal_as_float
+
+
+def build_index(path: Path, backend) -> float:
+    """Time building the index without the cache"""
+
+    start = time.perf_counter()
+    repository = pollyxt.PollyXTRepository(path, use_cache=False, backend=backend)
+    elapsed = time.perf_counter() - start
+    repository.close()
+    return elapsed
+
+
+def read_intervals(path: Path, backend, interval: timedelta) -> float:
+    """Time reading every interval and converting the measurement profiles to float64"""
+
+    with pollyxt.PollyXTRepository(path, use_cache=False, backend=backend) as repo:
+        first, last = repo.get_time_period()
+        start = time.perf_counter()
+        while first <= last:
+            slices = repo.find_slices(first, first + interval)
+            if len(slices) > 0:
+                pf = read_task(ReadTask(first, first + interval, slices), repo.pool)
+                profiles = pf.raw_signal_swap[~pf.calibration_mask]
+                if np.ma.isMaskedArray(profiles):
+                    profiles.astype(np.float64)
+                else:
+                    raw_signal_as_float(profiles, pf.raw_signal_fill_value)
+            first += interval
+        return time.perf_counter() - start
+
+
+def main():
+    path = Path(sys.argv[1])
+    interval = timedelta(minutes=int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    table = Table(title=f"{path} (best of {repeats})")
+    table.add_column("Arrays")
+    table.add_column("Index", justify="right")
+    table.add_column("Intervals", justify="right")
+
+    for name, mask_and_scale in [("masked", True), ("plain", False)]:
+        backend = NetCDF4Backend(mask_and_scale=mask_and_scale)
+        index = min(build_index(path, backend) for _ in range(repeats))
+        intervals = min(read_intervals(path, backend, interval) for _ in range(repeats))
+        table.add_row(name, f"{index:.3f}s", f"{intervals:.3f}s")
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
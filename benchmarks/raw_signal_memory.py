@@ -0,0 +1,90 @@
+"""
+Measures the peak memory (RSS) of converting one interval into an SCC file (see
+`pollyxt_pipelines.polly_to_scc.scc_netcdf.create_scc_netcdf`), with `raw_signal` kept in its
+on-disk dtype (`native`) and with it converted to float64 when it is read (`float64`, like older
+versions of the reader did). Each mode runs in a fresh process, so the peaks don't affect each other.
+
+Usage:
+    python benchmarks/raw_signal_memory.py <path to raw files> [interval in minutes]
+"""
+
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from pollyxt_pipelines.locations import LOCATIONS
+from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+
+
+def peak_rss() -> float:
+    """Returns the peak RSS of this process in MB (`ru_maxrss` is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def convert(
+    path: Path, interval: timedelta, as_float64: bool
+) -> Tuple[str, float, float, float]:
+    """
+    Reads the first interval of the repository and converts it into an SCC file
+
+    Returns:
+        The shape and dtype of the raw signal, the peak RSS before converting, the peak RSS after
+        converting and the time spent converting
+    """
+
+    location = LOCATIONS["Antikythera"]
+    with tempfile.TemporaryDirectory() as output_path, pollyxt.PollyXTRepository(
+        path, use_cache=False
+    ) as repo:
+        first, _ = repo.get_time_period()
+        pf = repo.get_pollyxt_file(first, first + interval)
+        if as_float64:
+            pf.raw_signal = pf.raw_signal.astype(np.float64)
+        pf.load()
+        before = peak_rss()
+
+        start = time.perf_counter()
+        scc_netcdf.create_scc_netcdf(
+            pf, Path(output_path), location, scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE
+        )
+        elapsed = time.perf_counter() - start
+
+        shape = " x ".join(str(x) for x in pf.raw_signal.shape)
+        return f"{shape} {pf.raw_signal.dtype}", before, peak_rss(), elapsed
+
+
+def main():
+    path = Path(sys.argv[1])
+    interval = timedelta(minutes=int(sys.argv[2]) if len(sys.argv) > 2 else 720)
+
+    table = Table(title=f"{path}")
+    table.add_column("Raw signal")
+    table.add_column("Peak RSS before writing", justify="right")
+    table.add_column("Peak RSS", justify="right")
+    table.add_column("Write time", justify="right")
+
+    context = multiprocessing.get_context("spawn")
+    for as_float64 in [False, True]:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            raw_signal, before, peak, elapsed = executor.submit(
+                convert, path, interval, as_float64
+            ).result()
+        table.add_row(
+            raw_signal, f"{before:.0f} MB", f"{peak:.0f} MB", f"{elapsed:.2f}s"
+        )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
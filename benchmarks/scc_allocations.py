@@ -0,0 +1,78 @@
+"""
+Tracks the memory allocated by NumPy while writing each SCC file (see
+`pollyxt_pipelines.polly_to_scc.scc_netcdf.create_scc_netcdf`), together with the shape of the raw
+signal of the file. The raw data are read before measuring, so only the writer is included, unless
+the raw signal is streamed (see `create_scc_netcdf(stream_profiles=...)`).
+
+Usage:
+    python benchmarks/scc_allocations.py <path to raw files> [interval in minutes] [stream profiles]
+"""
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from pollyxt_pipelines.locations import LOCATIONS
+from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+from pollyxt_pipelines.polly_to_scc.prefetch import read_task
+
+
+def main():
+    path = Path(sys.argv[1])
+    interval = timedelta(minutes=int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    stream_profiles = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    location = LOCATIONS["Antikythera"]
+
+    table = Table(title=f"{path}")
+    table.add_column("Start")
+    table.add_column("Raw signal shape", justify="right")
+    table.add_column("Peak allocated", justify="right")
+    table.add_column("Write time", justify="right")
+
+    with tempfile.TemporaryDirectory() as output_path, pollyxt.PollyXTRepository(
+        path
+    ) as repo:
+        first, last = repo.get_time_period()
+        tasks = scc_netcdf.conversion_tasks(
+            repo,
+            location,
+            first,
+            last,
+            interval,
+            calibration=False,
+            stream_profiles=stream_profiles,
+        )
+        for task in tasks:
+            pf = read_task(task, repo.pool)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            scc_netcdf.create_scc_netcdf(
+                pf,
+                Path(output_path),
+                location,
+                scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+                stream_profiles=stream_profiles,
+            )
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            table.add_row(
+                task.start.strftime("%Y-%m-%d %H:%M"),
+                " x ".join(str(x) for x in pf.raw_signal_shape),
+                f"{peak / 1024**2:.1f} MB",
+                f"{elapsed:.2f}s",
+            )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares the compression settings of SCC files (see `pollyxt_pipelines.polly_to_scc.scc_netcdf.
+Compression`) on write time and output size.
+
+Usage:
+    python benchmarks/scc_compression.py <path to raw files> [interval in minutes] [repeats]
+"""
+
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from pollyxt_pipelines.locations import LOCATIONS
+from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+from pollyxt_pipelines.polly_to_scc.prefetch import Timings
+
+SETTINGS = {
+    "default": scc_netcdf.Compression(),
+    "default, 64 profiles/chunk": scc_netcdf.Compression(chunk_profiles=64),
+    "no shuffle": scc_netcdf.Compression(shuffle=False),
+    "fast": scc_netcdf.Compression.from_mode("fast"),
+    "fast, 64 profiles/chunk": scc_netcdf.Compression(level=1, chunk_profiles=64),
+    "level 9": scc_netcdf.Compression(level=9),
+    "none": scc_netcdf.Compression.from_mode("none"),
+}
+
+
+def convert(path: Path, interval: timedelta, compression: scc_netcdf.Compression):
+    """Converts the raw files and returns the time spent writing and the total output size"""
+
+    timings = Timings()
+    with tempfile.TemporaryDirectory() as output_path, pollyxt.PollyXTRepository(
+        path
+    ) as repo:
+        output_path = Path(output_path)
+        for _ in scc_netcdf.convert_pollyxt_file(
+            repo,
+            output_path,
+            LOCATIONS["Antikythera"],
+            interval,
+            scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+            timings=timings,
+            compression=compression,
+        ):
+            pass
+        size = sum(file.stat().st_size for file in output_path.iterdir())
+    return timings.write, size
+
+
+def main():
+    path = Path(sys.argv[1])
+    interval = timedelta(minutes=int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    table = Table(title=f"{path} (best of {repeats})")
+    table.add_column("Compression")
+    table.add_column("Write time", justify="right")
+    table.add_column("Size", justify="right")
+
+    for name, compression in SETTINGS.items():
+        results = [convert(path, interval, compression) for _ in range(repeats)]
+        write = min(x[0] for x in results)
+        size = results[0][1]
+        table.add_row(name, f"{write:.2f}s", f"{size / 1024**2:.1f} MB")
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
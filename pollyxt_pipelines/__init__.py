@@ -8,7 +8,7 @@ import pkg_resources
 from cleo import Application
 
 from pollyxt_pipelines.radiosondes.commands import GetRadiosonde
-from pollyxt_pipelines.polly_to_scc.commands import CreateSCC
+from pollyxt_pipelines.polly_to_scc.commands import CreateSCC, RawIndex, ValidateRaw
 from pollyxt_pipelines.config import ConfigCommand
 from pollyxt_pipelines.scc_access.commands import (
     AutoUploadCalibration,
@@ -45,6 +45,8 @@ def prepare_cli_application() -> Application:
     application = Application("pollyxt_pipelines", get_package_version())
     application.add(GetRadiosonde())
     application.add(CreateSCC())
+    application.add(RawIndex())
+    application.add(ValidateRaw())
     application.add(ConfigCommand())
     application.add(Login())
     application.add(UploadFiles())
@@ -8,7 +8,7 @@ the .ini files are included with the software but custom locations can be define
 import io
 from importlib.resources import read_text
 from configparser import ConfigParser, SectionProxy
-from typing import NamedTuple, Union, Dict, List
+from typing import NamedTuple, Optional, Union, Dict, List
 
 from rich.markdown import Markdown
 from rich.table import Table
@@ -17,6 +17,9 @@ from pollyxt_pipelines.console import console
 from pollyxt_pipelines import config
 from pollyxt_pipelines.utils import ints_to_csv
 
+CALIBRATION_BACKGROUND_HIGH = 249
+"""Last range bin of the background in calibration files, which is the same for every location"""
+
 
 class Location(NamedTuple):
     """
@@ -104,6 +107,18 @@ class Location(NamedTuple):
     - 532_minus_45_reflected
     """
 
+    channels: Optional[List[int]] = None
+    """
+    Which raw file channels to include in SCC files, in ascending order and one for each
+    `channel_id`. If not set, all channels are included.
+    """
+
+    max_points: Optional[int] = None
+    """
+    Only include the first `max_points` range bins of each profile in SCC files, i.e. drop the bins
+    above the useful altitude. If not set, all bins are included.
+    """
+
     def print(self):
         """
         Prints this location as a Table in the terminal
@@ -142,6 +157,14 @@ class Location(NamedTuple):
             "calibration_532nm_channel_ids",
             ints_to_csv(self.calibration_532nm_channel_ids),
         )
+        table.add_row(
+            "channels",
+            ints_to_csv(self.channels) if self.channels is not None else "all",
+        )
+        table.add_row(
+            "max_points",
+            str(self.max_points) if self.max_points is not None else "all",
+        )
         table.add_row("profile_name", self.profile_name)
         table.add_row("sounding_provider", self.sounding_provider)
 
@@ -151,6 +174,9 @@ class Location(NamedTuple):
 def location_from_section(name: str, section: SectionProxy) -> Location:
     """
     Create a Location from a ConfigParser Section (SectionProxy)
+
+    Raises:
+        ValueError: When a value is invalid
     """
 
     channel_id = [int(x.strip()) for x in section.get("channel_id").split(",")]
@@ -167,6 +193,35 @@ def location_from_section(name: str, section: SectionProxy) -> Location:
         int(x.strip()) for x in section.get("calibration_532nm_channel_ids").split(",")
     ]
 
+    channels = None
+    if "channels" in section:
+        channels = [int(x.strip()) for x in section.get("channels").split(",")]
+        if channels != sorted(channels):
+            raise ValueError(f"Location {name}: `channels` must be in ascending order")
+
+    # The per-channel variables must agree with each other and, if set, with `channels`
+    per_channel = {
+        "channel_id": channel_id,
+        "background_low": background_low,
+        "background_high": background_high,
+        "lr_input": lr_input,
+    }
+    expected = len(channels) if channels is not None else len(channel_id)
+    for key, values in per_channel.items():
+        if len(values) != expected:
+            reference = "`channels`" if channels is not None else "`channel_id`"
+            raise ValueError(
+                f"Location {name}: `{key}` has {len(values)} values, but {reference} has {expected}"
+            )
+
+    # The background range bins must be inside the trimmed profiles
+    max_points = section.getint("max_points")
+    background_end = max(background_high + [CALIBRATION_BACKGROUND_HIGH])
+    if max_points is not None and max_points <= background_end:
+        raise ValueError(
+            f"Location {name}: `max_points` must be greater than the last background bin ({background_end})"
+        )
+
     return Location(
         name=name,
         scc_code=section["scc_code"],
@@ -195,6 +250,8 @@ def location_from_section(name: str, section: SectionProxy) -> Location:
         calibration_532nm_channel_ids=calibration_532nm_channel_ids,
         sounding_provider=section["sounding_provider"],
         profile_name=section["profile_name"],
+        channels=channels,
+        max_points=max_points,
     )
 
 
@@ -223,7 +280,11 @@ def read_locations() -> Dict[str, Location]:
 
     for name in locations_config.sections():
         section = locations_config[name]
-        locations[name] = location_from_section(name, section)
+        try:
+            locations[name] = location_from_section(name, section)
+        except ValueError as ex:
+            # Don't let one bad custom location break every command
+            console.print(f"[warn]Skipping invalid location:[/warn] {ex}")
 
     return locations
 
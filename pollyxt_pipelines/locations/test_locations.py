@@ -0,0 +1,45 @@
+from configparser import ConfigParser
+from importlib.resources import read_text
+
+from pollyxt_pipelines import config, locations
+
+
+def write_custom_location(path, name, **overrides):
+    """
+    Writes a custom `locations.ini` with a copy of the Antikythera location, with some values changed
+    """
+
+    builtin = ConfigParser()
+    builtin.read_string(read_text("pollyxt_pipelines.locations", "locations.ini"))
+
+    custom = ConfigParser()
+    custom[name] = dict(builtin["Antikythera"])
+    custom[name].update(overrides)
+    with open(path / "locations.ini", "w") as file:
+        custom.write(file)
+
+
+def test_invalid_channels_are_skipped(tmp_path, monkeypatch):
+    """
+    Tests that a custom location with the wrong number of per-channel values is skipped
+    """
+
+    write_custom_location(tmp_path, "Custom", channels="0, 1, 4, 5")
+    monkeypatch.setattr(config, "config_paths", lambda: [tmp_path])
+
+    result = locations.read_locations()
+    assert "Custom" not in result
+    assert "Antikythera" in result
+
+
+def test_invalid_max_points_are_skipped(tmp_path, monkeypatch):
+    """
+    Tests that a custom location whose `max_points` cuts off the background is skipped
+    """
+
+    write_custom_location(tmp_path, "Custom", max_points="200")
+    monkeypatch.setattr(config, "config_paths", lambda: [tmp_path])
+    assert "Custom" not in locations.read_locations()
+
+    write_custom_location(tmp_path, "Custom", max_points="2000")
+    assert locations.read_locations()["Custom"].max_points == 2000
@@ -0,0 +1,146 @@
+"""
+Backends for reading raw PollyXT files
+
+By default raw files are read with the `netCDF4` library. Since PollyXT files are NETCDF4 (i.e.
+HDF5) files, they can also be read with `h5py`, which has less overhead per read. This is
+noticeable when building the index of many files or reading some channels in blocks.
+
+A backend opens a file and returns an object that behaves like a read-only `netCDF4.Dataset`:
+`file[name]` returns a variable with `shape`, `ndim`, `dtype` and NumPy-style slicing, and
+`file.variables` contains the variable names.
+
+Variables are read as plain arrays: masking and scaling are disabled, since creating masked arrays
+for every read is slow and PollyXT files rarely contain missing values. Where missing values
+matter, use `fill_value()` to handle them explicitly.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Type
+
+import numpy as np
+from netCDF4 import Dataset, default_fillvals
+
+DEFAULT_BACKEND = "netcdf4"
+"""The backend that is used when none is configured"""
+
+
+def fill_value(variable) -> Optional[np.generic]:
+    """
+    Returns the value that marks missing data in a variable, i.e. its `_FillValue` attribute or the
+    netCDF default for its data type. Works with the variables of every backend.
+    """
+
+    attributes = getattr(variable, "attrs", None)
+    if attributes is None:
+        attributes = {name: variable.getncattr(name) for name in variable.ncattrs()}
+
+    if "_FillValue" in attributes:
+        return np.asarray(attributes["_FillValue"]).reshape(-1)[0]
+    return default_fillvals.get(variable.dtype.str[1:])
+
+
+def replace_fill_value(data: np.ndarray, variable, value) -> np.ndarray:
+    """
+    Replaces the missing values of data read from `variable` (see `fill_value()`) with `value`, in
+    place.
+    """
+
+    fill = fill_value(variable)
+    if fill is not None:
+        data[data == fill] = value
+    return data
+
+
+class NetCDF4Backend:
+    """Reads raw files using the `netCDF4` library"""
+
+    name = "netcdf4"
+
+    def __init__(self, mask_and_scale: bool = False):
+        """
+        Parameters:
+            mask_and_scale: If true, variables are read as masked arrays and scaled, like
+                `netCDF4` does by default. This is slower and only useful for comparisons.
+        """
+        self.mask_and_scale = mask_and_scale
+
+    def open(self, path: Path):
+        nc = Dataset(path, "r")
+        nc.set_auto_maskandscale(self.mask_and_scale)
+        return nc
+
+
+class H5pyFile:
+    """
+    A read-only HDF5 file that looks like a `netCDF4.Dataset`, see `H5pyBackend`
+    """
+
+    def __init__(self, path: Path):
+        import h5py
+
+        self.file = h5py.File(path, "r")
+
+    @property
+    def variables(self):
+        return self.file.keys()
+
+    def __getitem__(self, name: str):
+        return self.file[name]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "H5pyFile":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class H5pyBackend:
+    """
+    Reads raw files using the `h5py` library. Files that are not HDF5 (e.g. netCDF classic) are
+    read with `netCDF4` instead. Unlike `netCDF4`, the arrays are never masked.
+
+    Requires `h5py` to be installed.
+    """
+
+    name = "h5py"
+
+    def __init__(self):
+        try:
+            import h5py  # noqa: F401
+        except ImportError as ex:
+            raise ValueError(
+                "The h5py backend requires the h5py package (pip install pollyxt-pipelines[h5py])"
+            ) from ex
+
+    def open(self, path: Path):
+        import h5py
+
+        if not h5py.is_hdf5(path):
+            return NetCDF4Backend().open(path)
+        return H5pyFile(path)
+
+
+BACKENDS: Dict[str, Type] = {
+    NetCDF4Backend.name: NetCDF4Backend,
+    H5pyBackend.name: H5pyBackend,
+}
+"""All available backends, by name"""
+
+
+def get_backend(name: str):
+    """
+    Returns the backend with the given name
+
+    Raises:
+        ValueError: If the backend is unknown or not available
+    """
+
+    backend = BACKENDS.get(name.lower().strip())
+    if backend is None:
+        raise ValueError(
+            f"Unknown raw file backend {name} (available: {', '.join(BACKENDS)})"
+        )
+    return backend()
@@ -2,15 +2,137 @@
 Commands for creating SCC files
 """
 
+import json
+import os
+import shutil
 from datetime import timedelta
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 from cleo import Command
+from rich.markup import escape
+from rich.table import Table
 
 from pollyxt_pipelines.console import console
-from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+from pollyxt_pipelines.polly_to_scc import (
+    pollyxt,
+    scc_netcdf,
+    index_cache,
+    manifest,
+    validation,
+)
 from pollyxt_pipelines import locations, radiosondes
-from pollyxt_pipelines.polly_to_scc.exceptions import BadMeasurementTime
+from pollyxt_pipelines.config import Config
+from pollyxt_pipelines.polly_to_scc.dataset_pool import DEFAULT_CAPACITY
+from pollyxt_pipelines.polly_to_scc.prefetch import Timings
+from pollyxt_pipelines.polly_to_scc.backends import DEFAULT_BACKEND, get_backend
+from pollyxt_pipelines.polly_to_scc.compressed import (
+    DEFAULT_SCRATCH_BYTES,
+    ScratchCache,
+)
+from pollyxt_pipelines.polly_to_scc.exceptions import BadMeasurementTime, NoFilesFound
+
+
+def parse_workers_option(value: Optional[str]) -> int:
+    """
+    Parses the `--workers=` option. If it's not set, the `raw.workers` config variable is used and if
+    that is also undefined, one worker per CPU is used.
+
+    Raises:
+        ValueError: When the value is not a positive integer
+    """
+
+    if value is None:
+        value = Config()["raw"].get("workers")
+    if value is None:
+        return os.cpu_count() or 1
+
+    workers = int(value)
+    if workers < 1:
+        raise ValueError("The number of workers must be at least 1")
+    return workers
+
+
+def scratch_cache_from_config() -> ScratchCache:
+    """
+    Creates the scratch cache for compressed raw files, using the `raw.scratch_directory` and
+    `raw.scratch_size` (in MB) config variables if they are set.
+    """
+
+    config = Config()["raw"]
+    max_bytes = DEFAULT_SCRATCH_BYTES
+    if "scratch_size" in config:
+        max_bytes = int(config["scratch_size"]) * 1024 * 1024
+    return ScratchCache(config.get("scratch_directory"), max_bytes)
+
+
+def backend_from_config():
+    """
+    Returns the raw file backend selected by the `raw.backend` config variable (default is
+    `netcdf4`, see `backends`).
+
+    Raises:
+        ValueError: When the backend is unknown or not installed
+    """
+
+    return get_backend(Config()["raw"].get("backend", DEFAULT_BACKEND))
+
+
+def parse_duplicates_option(value: Optional[str]) -> pollyxt.DuplicatePolicy:
+    """
+    Parses the `--duplicates=` option. Default is `newest`.
+
+    Raises:
+        ValueError: When the value is not a known policy
+    """
+
+    if value is None:
+        return pollyxt.DuplicatePolicy.NEWEST
+    return pollyxt.DuplicatePolicy.from_string(value)
+
+
+def parse_compression_options(
+    mode: Optional[str],
+    level: Optional[str],
+    no_shuffle: bool,
+    chunk_profiles: Optional[str],
+) -> scc_netcdf.Compression:
+    """
+    Parses the `--compression=`, `--compression-level=`, `--no-shuffle` and `--chunk-profiles=`
+    options. The level and the other settings override those of the mode.
+
+    Raises:
+        ValueError: When a value is invalid
+    """
+
+    compression = scc_netcdf.Compression.from_mode(mode or "default")
+    if level is not None:
+        level = int(level)
+        if not 0 <= level <= 9:
+            raise ValueError("The compression level must be between 0 and 9")
+        compression = compression._replace(level=level)
+    if no_shuffle:
+        compression = compression._replace(shuffle=False)
+    if chunk_profiles is not None:
+        chunk_profiles = int(chunk_profiles)
+        if chunk_profiles < 1:
+            raise ValueError("The number of profiles per chunk must be at least 1")
+        compression = compression._replace(chunk_profiles=chunk_profiles)
+    return compression
+
+
+def print_dropped_profiles(repository: pollyxt.PollyXTRepository):
+    """
+    Warns about the profiles that were dropped from the repository as duplicates
+    """
+
+    for dropped in repository.dropped:
+        start = dropped.start.strftime("%Y-%m-%d %H:%M:%S")
+        end = dropped.end.strftime("%Y-%m-%d %H:%M:%S")
+        console.print(
+            f"[warn]Ignoring[/warn] {dropped.profiles} [warn]duplicate profiles of[/warn] {dropped.path} [warn]({start} - {end})[/warn]"
+        )
 
 
 class CreateSCC(Command):
@@ -30,6 +152,18 @@ class CreateSCC(Command):
         {--no-calibration : Do not create calibration files}
         {--system-id-day= : Optionally *override* the day system ID with a custom value.}
         {--system-id-night= : Optionally *override* the night system ID with a custom value.}
+        {--no-index-cache : Do not read or write the raw file index cache (see `raw-index`)}
+        {--workers= : How many raw files to read at the same time when building the index. Default is the `raw.workers` config variable or the number of CPUs.}
+        {--duplicates= : When raw files overlap, keep the profiles of the `newest` (default) or the `largest` file}
+        {--prefetch= : How many output files to read ahead in the background while writing. Default is 1, use 0 to disable.}
+        {--jobs= : How many output files to convert at the same time, each in its own process. Default is 1.}
+        {--compression= : How to compress the SCC files: default (zlib level 4), fast (zlib level 1) or none}
+        {--compression-level= : Override the zlib level of the compression mode (0-9, 0 disables compression)}
+        {--no-shuffle : Do not apply the shuffle filter before compressing}
+        {--chunk-profiles= : How many profiles to store in each chunk of Raw_Lidar_Data. Default is one.}
+        {--stream-profiles= : Read and write the raw signal of each output file in parts of this many profiles, to limit memory use for long intervals. Default is to read it at once.}
+        {--no-manifest : Do not read or write the manifest of the output directory, i.e. convert every interval}
+        {--rebuild : Convert every interval, even if the manifest lists its files as up to date}
     """
 
     help = """
@@ -68,6 +202,18 @@ class CreateSCC(Command):
     - `automatic`: Let SCC decide
 
     If you select `radiosonde`, you must have a functioning radiosonde provider to create the files.
+
+    Duplicates
+    ----------
+    If the same timestamp appears in multiple raw files (for example, files synced twice from the instrument), only the
+    profile of one file is used. With `--duplicates=newest` (default) the most recently modified file is preferred, while
+    with `--duplicates=largest` the largest file is preferred. Ignored profiles are listed before conversion.
+
+    Incremental conversion
+    ----------------------
+    The created files are listed in a manifest inside the output directory (`.pollyxt_manifest.json`), together with
+    the raw files, location and options they were created from. When the command runs again, files whose inputs haven't
+    changed are skipped. Use `--rebuild` to convert everything again or `--no-manifest` to disable the manifest.
     """
 
     def handle(self):
@@ -112,6 +258,66 @@ class CreateSCC(Command):
                 )
                 return 1
 
+        try:
+            workers = parse_workers_option(self.option("workers"))
+        except ValueError:
+            console.print(
+                "[error]Value for workers must be a positive integer![/error]"
+            )
+            return 1
+
+        try:
+            duplicates = parse_duplicates_option(self.option("duplicates"))
+        except ValueError:
+            console.print(
+                "[error]Value for duplicates must be newest or largest![/error]"
+            )
+            return 1
+
+        prefetch = self.option("prefetch")
+        try:
+            prefetch = int(prefetch) if prefetch is not None else 1
+            if prefetch < 0:
+                raise ValueError()
+        except ValueError:
+            console.print(
+                "[error]Value for prefetch must be a non-negative integer![/error]"
+            )
+            return 1
+
+        jobs = self.option("jobs")
+        try:
+            jobs = int(jobs) if jobs is not None else 1
+            if jobs < 1:
+                raise ValueError()
+        except ValueError:
+            console.print("[error]Value for jobs must be a positive integer![/error]")
+            return 1
+
+        stream_profiles = self.option("stream-profiles")
+        try:
+            stream_profiles = (
+                int(stream_profiles) if stream_profiles is not None else None
+            )
+            if stream_profiles is not None and stream_profiles < 1:
+                raise ValueError()
+        except ValueError:
+            console.print(
+                "[error]Value for stream-profiles must be a positive integer![/error]"
+            )
+            return 1
+
+        try:
+            compression = parse_compression_options(
+                self.option("compression"),
+                self.option("compression-level"),
+                self.option("no-shuffle"),
+                self.option("chunk-profiles"),
+            )
+        except ValueError as ex:
+            console.print(f"[error]Invalid compression settings: {ex}[/error]")
+            return 1
+
         # Try to get location
         location_name = self.argument("location")
         location = locations.LOCATIONS[location_name]
@@ -126,49 +332,290 @@ class CreateSCC(Command):
             location = location._replace(nighttime_configuration=system_id_night)
 
         # Create a repository for the given path
+        max_open_files = int(Config()["raw"].get("max_open_files", DEFAULT_CAPACITY))
+        try:
+            backend = backend_from_config()
+        except ValueError as ex:
+            console.print(f"[error]{ex}[/error]")
+            return 1
         try:
             console.print("Building repository...")
-            repository = pollyxt.PollyXTRepository(Path(self.argument("input")))
+            repository = pollyxt.PollyXTRepository(
+                Path(self.argument("input")),
+                use_cache=(not self.option("no-index-cache")),
+                recursive=self.option("recursive"),
+                workers=workers,
+                max_open_files=max_open_files,
+                scratch=scratch_cache_from_config(),
+                duplicates=duplicates,
+                backend=backend,
+            )
         except BadMeasurementTime as ex:
             console.print(
                 f"[error]While reading file[/error] {ex.filename} [error]an invalid measurement_time value was encountered:[/error] {ex.value}"
             )
             console.print("[error]Remove this file and try again[/error]")
             return 1
+        print_dropped_profiles(repository)
 
         # Iterate over list and convert files
         skip_calibration = self.option("no-calibration")
+        timings = Timings()
+        conversion_manifest = None
+        if not self.option("no-manifest"):
+            conversion_manifest = manifest.Manifest(output_path)
+            if self.option("rebuild"):
+                conversion_manifest.clear()
+
+        with repository:
+            converter = scc_netcdf.convert_pollyxt_file(
+                repository,
+                output_path,
+                location,
+                interval,
+                should_round=should_round,
+                calibration=(not skip_calibration),
+                atmosphere=atmosphere,
+                start_time=start_time,
+                end_time=end_time,
+                prefetch=prefetch,
+                timings=timings,
+                jobs=jobs,
+                compression=compression,
+                stream_profiles=stream_profiles,
+                manifest=conversion_manifest,
+            )
+            for id, path, timestamp_start, timestamp_end in converter:
+                start_str = timestamp_start.strftime("%Y-%m-%d %H:%M")
+                end_str = timestamp_end.strftime("%Y-%m-%d %H:%M")
+                if "calibration" in str(path):
+                    console.print(
+                        f"[info]Created calibration file with measurement ID[/info] {id} [info]at[/info] {str(path)} [info]({start_str} - {end_str})[/info]"
+                    )
+                else:
+                    console.print(
+                        f"[info]Created file with measurement ID[/info] {id} [info]at[/info] {str(path)} [info]({start_str} - {end_str})[/info]"
+                    )
 
-        converter = scc_netcdf.convert_pollyxt_file(
-            repository,
-            output_path,
-            location,
-            interval,
-            should_round=should_round,
-            calibration=(not skip_calibration),
-            atmosphere=atmosphere,
-            start_time=start_time,
-            end_time=end_time,
+                if atmosphere == scc_netcdf.Atmosphere.RADIOSONDE:
+                    radiosondes.create_radiosonde_netcdf(
+                        "wrf_noa",
+                        location,
+                        timestamp_start,
+                        timestamp_start + interval,
+                        netcdf_path=output_path / f"rs_{id[:-2]}.nc",
+                    )
+
+        if conversion_manifest is not None and conversion_manifest.skipped > 0:
+            console.print(
+                f"[info]Skipped[/info] {conversion_manifest.skipped} [info]intervals that are up to date (use --rebuild to convert them again)[/info]"
+            )
+        console.print(
+            f"\n[info]Reading took[/info] {timings.read:.1f}s [info]({timings.overlap:.0%} overlapped with writing), writing took[/info] {timings.write:.1f}s"
         )
-        for id, path, timestamp_start, timestamp_end in converter:
-            start_str = timestamp_start.strftime("%Y-%m-%d %H:%M")
-            end_str = timestamp_end.strftime("%Y-%m-%d %H:%M")
-            if "calibration" in str(path):
-                console.print(
-                    f"[info]Created calibration file with measurement ID[/info] {id} [info]at[/info] {str(path)} [info]({start_str} - {end_str})[/info]"
-                )
-            else:
-                console.print(
-                    f"[info]Created file with measurement ID[/info] {id} [info]at[/info] {str(path)} [info]({start_str} - {end_str})[/info]"
-                )
+        console.print("[info]Done![/info]")
+
+
+class RawIndex(Command):
+    """
+    Build (or rebuild) the index cache of a directory of PollyXT files and print its contents
+
+    raw-index
+        {input : Path to PollyXT files. Can be a single file or a directory of files.}
+        {--recursive : If set, the input directory will be searched recursively (i.e. in subdirectories). Ignored for files}
+        {--rebuild : Discard the existing cache and read every file again}
+        {--workers= : How many raw files to read at the same time. Default is the `raw.workers` config variable or the number of CPUs.}
+        {--duplicates= : When raw files overlap, keep the profiles of the `newest` (default) or the `largest` file}
+    """
+
+    help = """
+    To avoid opening every raw file each time `create-scc` runs, the time and calibration information of each file is
+    stored in a hidden file inside its directory (`.pollyxt_index.npz`). Files that are added or modified (i.e. their size
+    or modification time changes) are automatically read again, so you normally don't need to use this command. It can
+    be used to build the cache ahead of time (e.g. after syncing new files) or to inspect what the cache contains.
+    """
+
+    def handle(self):
+        input_path = Path(self.argument("input"))
+        recursive = self.option("recursive")
+
+        try:
+            workers = parse_workers_option(self.option("workers"))
+        except ValueError:
+            console.print(
+                "[error]Value for workers must be a positive integer![/error]"
+            )
+            return 1
+
+        try:
+            duplicates = parse_duplicates_option(self.option("duplicates"))
+        except ValueError:
+            console.print(
+                "[error]Value for duplicates must be newest or largest![/error]"
+            )
+            return 1
+
+        try:
+            backend = backend_from_config()
+        except ValueError as ex:
+            console.print(f"[error]{ex}[/error]")
+            return 1
+
+        if self.option("rebuild"):
+            try:
+                files = pollyxt.find_raw_files(input_path, recursive)
+            except ValueError as ex:
+                console.print(f"[error]{ex}[/error]")
+                return 1
+            for directory in set(path.parent for path in files):
+                cache = index_cache.IndexCache(directory)
+                cache.clear()
+                cache.save()
+
+        try:
+            console.print("Building repository...")
+            repository = pollyxt.PollyXTRepository(
+                input_path,
+                recursive=recursive,
+                workers=workers,
+                scratch=scratch_cache_from_config(),
+                duplicates=duplicates,
+                backend=backend,
+            )
+        except (NoFilesFound, ValueError) as ex:
+            console.print(f"[error]{ex}[/error]")
+            return 1
+        except BadMeasurementTime as ex:
+            console.print(
+                f"[error]While reading file[/error] {ex.filename} [error]an invalid measurement_time value was encountered:[/error] {ex.value}"
+            )
+            return 1
+
+        table = Table(title=str(input_path))
+        table.add_column("File")
+        table.add_column("Profiles", justify="right")
+        table.add_column("Start")
+        table.add_column("End")
+
+        # The index is sorted by time, so the first and last row of each file are its start and end
+        file_count = len(repository.files)
+        profiles = np.bincount(repository.file_ids, minlength=file_count)
+        ids, first_rows = np.unique(repository.file_ids, return_index=True)
+        first = dict(zip(ids, first_rows))
+        ids, last_rows = np.unique(repository.file_ids[::-1], return_index=True)
+        last = dict(zip(ids, repository.file_ids.shape[0] - 1 - last_rows))
+
+        root = input_path if input_path.is_dir() else input_path.parent
+        for file_id, path in enumerate(repository.files):
+            name = str(path.relative_to(root))
+            if profiles[file_id] == 0:
+                table.add_row(name, "0", "-", "-")
+                continue
+
+            start = repository.timestamps[first[file_id]].item()
+            end = repository.timestamps[last[file_id]].item()
+            table.add_row(
+                name,
+                str(profiles[file_id]),
+                start.strftime("%Y-%m-%d %H:%M:%S"),
+                end.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+
+        console.print(table)
+        print_dropped_profiles(repository)
+        repository.close()
+
+        return 0
+
+
+class ValidateRaw(Command):
+    """
+    Check PollyXT files for problems and report all of them at once
+
+    validate-raw
+        {input : Path to PollyXT files. Can be a single file or a directory of files.}
+        {--recursive : If set, the input directory will be searched recursively (i.e. in subdirectories). Ignored for files}
+        {--workers= : How many raw files to check at the same time. Default is the `raw.workers` config variable or the number of CPUs.}
+        {--json : Print the report as JSON instead of a table}
+        {--quarantine= : Move the files with problems to this directory}
+    """
+
+    help = """
+    `create-scc` stops at the first raw file with an invalid `measurement_time`. This command checks every file for invalid
+    timestamps, missing variables and mismatched dimensions and reports all problems in one go. Use `--quarantine=` to
+    move the bad files out of the way, so the next `create-scc` run works on the first try.
 
-            if atmosphere == scc_netcdf.Atmosphere.RADIOSONDE:
-                radiosondes.create_radiosonde_netcdf(
-                    "wrf_noa",
-                    location,
-                    timestamp_start,
-                    timestamp_start + interval,
-                    netcdf_path=output_path / f"rs_{id[:-2]}.nc",
+    The exit code is 1 if any problems were found.
+    """
+
+    def handle(self):
+        input_path = Path(self.argument("input"))
+        as_json = self.option("json")
+
+        try:
+            workers = parse_workers_option(self.option("workers"))
+        except ValueError:
+            console.print(
+                "[error]Value for workers must be a positive integer![/error]"
+            )
+            return 1
+
+        try:
+            files = pollyxt.find_raw_files(input_path, self.option("recursive"))
+        except ValueError as ex:
+            console.print(f"[error]{ex}[/error]")
+            return 1
+        if len(files) == 0:
+            console.print(f"[error]{NoFilesFound(input_path)}[/error]")
+            return 1
+
+        if not as_json:
+            console.print(f"Checking {len(files)} files...")
+        report = validation.validate_files(
+            files, workers, scratch=scratch_cache_from_config()
+        )
+        bad_files = [path for path, problems in report.items() if len(problems) > 0]
+
+        # Move bad files to the quarantine directory, keeping their relative paths
+        root = input_path if input_path.is_dir() else input_path.parent
+        quarantine = self.option("quarantine")
+        moved = {}
+        if quarantine is not None:
+            for path in bad_files:
+                destination = Path(quarantine) / path.relative_to(root)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(path), str(destination))
+                moved[path] = destination
+
+        if as_json:
+            output = {
+                "files": len(files),
+                "bad_files": [
+                    {
+                        "path": str(path),
+                        "problems": report[path],
+                        "quarantined": str(moved[path]) if path in moved else None,
+                    }
+                    for path in bad_files
+                ],
+            }
+            print(json.dumps(output, indent=2))
+        elif len(bad_files) == 0:
+            console.print(f"[info]All {len(files)} files are OK[/info]")
+        else:
+            table = Table(title=str(input_path))
+            table.add_column("File")
+            table.add_column("Problems")
+            for path in bad_files:
+                table.add_row(
+                    escape(str(path.relative_to(root))),
+                    escape("\n".join(report[path])),
                 )
+            console.print(table)
+            console.print(
+                f"[error]Found problems in[/error] {len(bad_files)} [error]of[/error] {len(files)} [error]files[/error]"
+            )
+            if len(moved) > 0:
+                console.print(f"[info]Moved bad files to[/info] {quarantine}")
 
-        console.print("\n[info]Done![/info]")
+        return 1 if len(bad_files) > 0 else 0
@@ -0,0 +1,169 @@
+"""
+Support for compressed raw files
+
+Archived PollyXT files are often stored as `.nc.gz` or `.nc.zip`. netCDF can't read these directly,
+so they are decompressed (the first time they are needed) into a scratch directory. The scratch
+directory is shared between runs and limited in size: when it grows too large, the least
+recently used files are deleted.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Optional
+
+COMPRESSED_SUFFIXES = (".nc.gz", ".nc.zip")
+"""File extensions of compressed raw files"""
+
+DEFAULT_SCRATCH_DIRECTORY = Path(tempfile.gettempdir()) / "pollyxt_pipelines_scratch"
+"""Where decompressed files are stored by default"""
+
+DEFAULT_SCRATCH_BYTES = 10 * 1024**3
+"""Default size limit of the scratch directory (10 GB)"""
+
+
+def is_compressed(path: Path) -> bool:
+    """Returns True if the given raw file is compressed"""
+    return path.name.endswith(COMPRESSED_SUFFIXES)
+
+
+def decompress(path: Path, destination: Path):
+    """
+    Decompresses a `.nc.gz` or `.nc.zip` file. Zip archives must contain one netCDF file.
+
+    Raises:
+        OSError: If the archive can't be read
+    """
+
+    try:
+        if path.name.endswith(".gz"):
+            with gzip.open(path, "rb") as source, open(destination, "wb") as output:
+                shutil.copyfileobj(source, output)
+        else:
+            with zipfile.ZipFile(path) as archive:
+                members = [x for x in archive.namelist() if x.endswith(".nc")]
+                if len(members) != 1:
+                    raise OSError(f"Expected one netCDF file inside {path}")
+                with archive.open(members[0]) as source, open(
+                    destination, "wb"
+                ) as output:
+                    shutil.copyfileobj(source, output)
+    except (zipfile.BadZipFile, EOFError, zlib.error) as ex:
+        raise OSError(f"Could not decompress {path}: {ex}") from ex
+
+
+class ScratchCache:
+    """
+    Size-bounded directory of decompressed raw files. Use `get()` to retrieve the decompressed
+    version of a file. Since it only depends on the files inside the directory, it can be used from
+    multiple processes at the same time.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_bytes: int = DEFAULT_SCRATCH_BYTES,
+    ):
+        """
+        Parameters:
+            directory: Where to store the decompressed files. Default is `DEFAULT_SCRATCH_DIRECTORY`.
+            max_bytes: When the decompressed files are larger than this, the least recently used
+                ones are deleted. Should be large enough for a few raw files.
+        """
+
+        self.directory = (
+            Path(directory) if directory is not None else DEFAULT_SCRATCH_DIRECTORY
+        )
+        self.max_bytes = max_bytes
+
+    def local_path(self, path: Path) -> Path:
+        """
+        Returns where the decompressed version of a file is stored. The name depends on the size and
+        modification time of the compressed file, so modified archives are decompressed again.
+        """
+
+        stat = path.stat()
+        key = f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        name = path.name[: -len(".gz")] if path.name.endswith(".gz") else path.name
+        name = name[: -len(".zip")] if name.endswith(".zip") else name
+
+        return self.directory / f"{digest}_{name}"
+
+    def get(self, path: Path) -> Path:
+        """
+        Returns the path of the decompressed file, decompressing it if necessary.
+
+        Raises:
+            OSError: If the file can't be decompressed
+        """
+
+        local = self.local_path(path)
+        try:
+            os.utime(local)  # Mark as recently used
+            return local
+        except FileNotFoundError:
+            pass
+
+        local.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = local.with_name(f"{local.name}.{os.getpid()}.tmp")
+        try:
+            decompress(path, tmp_path)
+            os.replace(tmp_path, local)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        self.evict(keep=local)
+        return local
+
+    def evict(self, keep: Optional[Path] = None):
+        """
+        Deletes the least recently used files until the directory fits in `max_bytes`.
+
+        Parameters:
+            keep: Never delete this file, even if it's the oldest one
+        """
+
+        files = []
+        for file in self.directory.glob("*.nc"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue  # Deleted by another process
+            files.append((stat.st_mtime_ns, stat.st_size, file))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files, key=lambda x: x[0]):
+            if total <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            try:
+                file.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def local_raw_path(path: Path, scratch: Optional[ScratchCache] = None) -> Path:
+    """
+    Returns a path that netCDF can open for the given raw file: the file itself or, for compressed
+    files, the decompressed version from the scratch cache.
+
+    Parameters:
+        path: The raw file
+        scratch: The cache to use for compressed files. If `None`, a cache with the default
+            settings is used.
+    """
+
+    if not is_compressed(path):
+        return path
+    if scratch is None:
+        scratch = ScratchCache()
+    return scratch.get(path)
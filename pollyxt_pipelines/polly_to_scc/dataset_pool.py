@@ -0,0 +1,110 @@
+"""
+A pool of open netCDF files
+
+Converting a repository reads the same raw files many times (once for each output interval and
+calibration period). Instead of opening and closing the files every time, `DatasetPool` keeps a
+limited number of read-only handles open and closes the least recently used one when full.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from netCDF4 import Dataset
+
+from pollyxt_pipelines.polly_to_scc.compressed import ScratchCache, local_raw_path
+from pollyxt_pipelines.polly_to_scc.backends import NetCDF4Backend
+
+DEFAULT_CAPACITY = 8
+"""Default number of files to keep open"""
+
+
+class DatasetPool:
+    """
+    Bounded LRU cache of open read-only file handles (`netCDF4.Dataset` or the equivalent of another
+    backend, see `backends`). Can be used as a context manager,
+    which closes all files on exit.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        scratch: Optional[ScratchCache] = None,
+        backend=None,
+    ):
+        """
+        Parameters:
+            capacity: Maximum number of files to keep open at the same time
+            scratch: Where to decompress compressed raw files (see `ScratchCache`)
+            backend: How to open the files (see `backends`). Default is `netCDF4`.
+        """
+
+        if capacity < 1:
+            raise ValueError("The capacity of a DatasetPool must be at least 1")
+
+        self.capacity = capacity
+        self.scratch = scratch
+        self.backend = backend if backend is not None else NetCDF4Backend()
+        self.datasets: "OrderedDict[Path, Dataset]" = OrderedDict()
+
+    def get(self, path: Path) -> Dataset:
+        """
+        Returns an open handle for the given file. The handle belongs to the pool and must not be
+        closed by the caller.
+        """
+
+        path = Path(path)
+        nc = self.datasets.get(path)
+        if nc is not None:
+            self.datasets.move_to_end(path)
+            return nc
+
+        # Make room for the new file
+        while len(self.datasets) >= self.capacity:
+            _, oldest = self.datasets.popitem(last=False)
+            oldest.close()
+
+        nc = self.backend.open(local_raw_path(path, self.scratch))
+        self.datasets[path] = nc
+        return nc
+
+    def close(self):
+        """Close all open files"""
+        while len(self.datasets) > 0:
+            _, nc = self.datasets.popitem()
+            nc.close()
+
+    def __enter__(self) -> "DatasetPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@contextmanager
+def open_dataset(
+    path: Path,
+    pool: Optional[DatasetPool] = None,
+    scratch: Optional[ScratchCache] = None,
+    backend=None,
+) -> Iterator[Dataset]:
+    """
+    Open a netCDF file for reading, either through a pool or directly. Use this as a context
+    manager: files opened directly are closed on exit, while pooled files stay open. Compressed
+    files are transparently decompressed (see `local_raw_path()`).
+
+    Parameters:
+        path: Which file to open
+        pool: The pool to use. If `None`, the file is opened (and closed) directly.
+        scratch: Where to decompress compressed files, when not using a pool
+        backend: How to open the file, when not using a pool (see `backends`)
+    """
+
+    if pool is None:
+        if backend is None:
+            backend = NetCDF4Backend()
+        with backend.open(local_raw_path(Path(path), scratch)) as nc:
+            yield nc
+    else:
+        yield pool.get(path)
@@ -0,0 +1,186 @@
+"""
+Persistent cache for the index of a PollyXT repository
+
+Building a `PollyXTRepository` requires opening every raw file to read its `measurement_time` and
+`depol_cal_angle` variables. To avoid doing this on every run, these variables are stored in a
+sidecar file inside each directory. Entries are keyed by filename, size and modification time, so
+changed files are transparently read again.
+"""
+
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from pollyxt_pipelines.utils import atomic_write
+
+INDEX_CACHE_FILENAME = ".pollyxt_index.npz"
+"""Name of the sidecar file that is stored in each directory"""
+
+INDEX_CACHE_VERSION = 2
+"""Bump this when the layout or the meaning of the cache file changes. Old caches are then ignored."""
+
+
+class CacheEntry(NamedTuple):
+    """
+    The cached index variables of one raw file
+    """
+
+    size: int
+    """File size in bytes, when the entry was created"""
+
+    mtime: int
+    """File modification time (in nanoseconds), when the entry was created"""
+
+    measurement_time: np.ndarray
+    """The `measurement_time` variable of the file"""
+
+    depol_cal_angle: np.ndarray
+    """The `depol_cal_angle` variable of the file"""
+
+
+def file_signature(path: Path) -> Tuple[int, int]:
+    """
+    Returns the size and modification time of a file, which are used to detect changes.
+    """
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+class IndexCache:
+    """
+    The index cache of one directory. Use `get()` to retrieve the index variables of a file (if they
+    are still valid) and `put()` to store them. Call `save()` to persist any changes.
+    """
+
+    def __init__(self, directory: Path):
+        """
+        Load the cache of a directory. If there is no cache file, or the file can't be read, an
+        empty cache is created.
+
+        Parameters:
+            directory: The directory containing the raw files
+        """
+
+        self.directory = directory
+        self.path = directory / INDEX_CACHE_FILENAME
+        self.entries: Dict[str, CacheEntry] = {}
+        self.dirty = False
+
+        if self.path.is_file():
+            try:
+                self.entries = self._load()
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                # Corrupted or incompatible cache, it will be rebuilt
+                self.entries = {}
+                self.dirty = True
+
+    def _load(self) -> Dict[str, CacheEntry]:
+        """Read the entries from the cache file"""
+
+        with np.load(self.path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_CACHE_VERSION:
+                raise ValueError("Incompatible index cache version")
+
+            names = data["names"]
+            sizes = data["sizes"]
+            mtimes = data["mtimes"]
+            offsets = np.concatenate([[0], np.cumsum(data["counts"])])
+            measurement_time = data["measurement_time"]
+            depol_cal_angle = data["depol_cal_angle"]
+
+        entries = {}
+        for i, name in enumerate(names):
+            start, end = offsets[i], offsets[i + 1]
+            entries[str(name)] = CacheEntry(
+                size=int(sizes[i]),
+                mtime=int(mtimes[i]),
+                measurement_time=measurement_time[start:end],
+                depol_cal_angle=depol_cal_angle[start:end],
+            )
+
+        return entries
+
+    def get(self, path: Path) -> Optional[CacheEntry]:
+        """
+        Returns the cached entry for a file or `None` if the file is not cached or has been
+        modified since it was cached.
+        """
+
+        entry = self.entries.get(path.name)
+        if entry is None:
+            return None
+
+        if (entry.size, entry.mtime) != file_signature(path):
+            return None
+
+        return entry
+
+    def put(
+        self, path: Path, measurement_time: np.ndarray, depol_cal_angle: np.ndarray
+    ):
+        """
+        Store the index variables of a file in the cache
+        """
+
+        size, mtime = file_signature(path)
+        self.entries[path.name] = CacheEntry(
+            size=size,
+            mtime=mtime,
+            measurement_time=np.asarray(measurement_time, dtype=np.int64),
+            depol_cal_angle=np.asarray(depol_cal_angle, dtype=np.float64),
+        )
+        self.dirty = True
+
+    def retain(self, names: Iterable[str]):
+        """
+        Drop any entries that are not in `names`, for example files that were deleted.
+        """
+
+        names = set(names)
+        for name in list(self.entries.keys()):
+            if name not in names:
+                del self.entries[name]
+                self.dirty = True
+
+    def clear(self):
+        """Drop all entries"""
+        self.entries = {}
+        self.dirty = True
+
+    def save(self):
+        """
+        Write the cache to disk, if it has changed. Since the cache is only an optimization, any
+        errors (for example, a read-only directory) are ignored.
+        """
+
+        if not self.dirty:
+            return
+
+        names = sorted(self.entries.keys())
+        entries = [self.entries[name] for name in names]
+        if len(entries) > 0:
+            measurement_time = np.concatenate([e.measurement_time for e in entries])
+            depol_cal_angle = np.concatenate([e.depol_cal_angle for e in entries])
+        else:
+            measurement_time = np.zeros((0, 2), dtype=np.int64)
+            depol_cal_angle = np.zeros(0, dtype=np.float64)
+
+        try:
+            with atomic_write(self.path, "wb") as file:
+                np.savez(
+                    file,
+                    version=INDEX_CACHE_VERSION,
+                    names=np.array(names, dtype=str),
+                    sizes=np.array([e.size for e in entries], dtype=np.int64),
+                    mtimes=np.array([e.mtime for e in entries], dtype=np.int64),
+                    counts=np.array(
+                        [e.measurement_time.shape[0] for e in entries], dtype=np.int64
+                    ),
+                    measurement_time=measurement_time,
+                    depol_cal_angle=depol_cal_angle,
+                )
+            self.dirty = False
+        except OSError:
+            pass
@@ -0,0 +1,199 @@
+"""
+Manifest of the SCC files in an output directory
+
+`create-scc` records, for every output file (or pair of calibration files), which raw files it was
+created from (with their size and modification time), the location and the conversion options.
+This is stored in a sidecar file inside the output directory. When the conversion runs again (for
+example, nightly over a rolling window), intervals whose inputs haven't changed are skipped and
+their raw data are never read.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from pollyxt_pipelines.utils import atomic_write
+from pollyxt_pipelines.polly_to_scc.index_cache import file_signature
+from pollyxt_pipelines.polly_to_scc.prefetch import ReadTask
+
+MANIFEST_FILENAME = ".pollyxt_manifest.json"
+"""Name of the sidecar file that is stored in the output directory"""
+
+MANIFEST_VERSION = 1
+"""Bump this when the layout of the manifest or the SCC files changes. Old manifests are then ignored."""
+
+
+def _to_json(value) -> object:
+    """Converts a value to what it would be after a round-trip through JSON, so it can be compared"""
+    return json.loads(json.dumps(value, default=str))
+
+
+class Manifest:
+    """
+    The manifest of one output directory. Use `is_current()` to check if a task has to be converted
+    and `record()` to store the files it produced. Call `save()` to persist any changes.
+    """
+
+    def __init__(self, output_path: Path):
+        """
+        Load the manifest of a directory. If there is no manifest, or it can't be read, an empty one
+        is created.
+
+        Parameters:
+            output_path: The directory containing the SCC files
+        """
+
+        self.output_path = output_path
+        self.path = output_path / MANIFEST_FILENAME
+        self.entries: Dict[str, dict] = {}
+        self.signatures: Dict[Path, Tuple[int, int]] = {}
+        self.dirty = False
+
+        self.skipped = 0
+        """How many tasks were skipped because their files were current (see `skip_current()`)"""
+
+        if self.path.is_file():
+            try:
+                with open(self.path) as file:
+                    data = json.load(file)
+                if data["version"] != MANIFEST_VERSION:
+                    raise ValueError("Incompatible manifest version")
+                self.entries = data["entries"]
+            except (OSError, ValueError, KeyError, TypeError):
+                # Without a usable manifest, no task can be skipped
+                self.entries = {}
+                self.dirty = True
+
+    @staticmethod
+    def key(task: ReadTask) -> str:
+        """Returns the name of the entry of a task"""
+
+        kind = "calibration" if task.calibration else "measurement"
+        return f"{kind} {task.start.isoformat()} {task.end.isoformat()}"
+
+    def _inputs(self, task: ReadTask) -> List[dict]:
+        """Describes the raw files of a task, including their size and modification time"""
+
+        inputs = []
+        for path, start, end in task.slices:
+            if path not in self.signatures:
+                self.signatures[path] = file_signature(path)
+            size, mtime = self.signatures[path]
+            inputs.append(
+                {
+                    "path": str(path.resolve()),
+                    "start": int(start),
+                    "end": int(end),
+                    "size": size,
+                    "mtime": mtime,
+                }
+            )
+        return inputs
+
+    def is_current(self, task: ReadTask, options: Dict[str, object]) -> bool:
+        """
+        Returns True if the files of a task were created from the same raw files and options, and
+        still exist in the output directory
+
+        Parameters:
+            task: What would be converted
+            options: Everything besides the raw files that affects the output files, e.g. the
+                location and the conversion options. Must be convertible to JSON.
+        """
+
+        entry = self.entries.get(self.key(task))
+        if entry is None:
+            return False
+
+        if entry["options"] != _to_json(options):
+            return False
+        if entry["inputs"] != self._inputs(task):
+            return False
+
+        return self._outputs_exist(entry)
+
+    def _outputs_exist(self, entry: dict) -> bool:
+        """Returns True if all files of an entry are still in the output directory"""
+        return all(
+            (self.output_path / name).is_file() for name, _, _, _ in entry["outputs"]
+        )
+
+    def skip_current(
+        self, tasks: Iterable[ReadTask], options: Dict[str, object]
+    ) -> Iterator[ReadTask]:
+        """
+        Returns the tasks that have to be converted, i.e. those that are not current (see
+        `is_current()`). The others are counted in `skipped`.
+        """
+
+        for task in tasks:
+            if self.is_current(task, options):
+                self.skipped += 1
+                continue
+            yield task
+
+    def record(
+        self,
+        task: ReadTask,
+        options: Dict[str, object],
+        outputs: List[Tuple[str, Path, datetime, datetime]],
+    ):
+        """
+        Store the files that were created for a task, with the options they were created with (see
+        `is_current()`)
+
+        Parameters:
+            task: What was converted
+            options: See `is_current()`
+            outputs: The measurement ID, path, start and end of each file
+        """
+
+        self.entries[self.key(task)] = {
+            "inputs": self._inputs(task),
+            "options": _to_json(options),
+            "outputs": [
+                [path.name, id, start.isoformat(), end.isoformat()]
+                for id, path, start, end in outputs
+            ],
+        }
+        self.dirty = True
+
+    def prune(self):
+        """
+        Drop the entries whose files are no longer in the output directory (e.g. they were deleted
+        or rotated away), so the manifest doesn't grow with every run
+        """
+
+        for key, entry in list(self.entries.items()):
+            if not self._outputs_exist(entry):
+                del self.entries[key]
+                self.dirty = True
+
+    def clear(self):
+        """Drop all entries, so every task is converted again"""
+        self.entries = {}
+        self.dirty = True
+
+    def save(self):
+        """
+        Write the manifest to disk, if it has changed. If it can't be written (e.g. the output
+        directory is read-only), the next run converts everything again. Entries of deleted files are
+        dropped first (see `prune()`).
+        """
+
+        self.prune()
+        if not self.dirty:
+            return
+
+        try:
+            with atomic_write(self.path) as file:
+                json.dump(
+                    {"version": MANIFEST_VERSION, "entries": self.entries},
+                    file,
+                    indent=1,
+                    sort_keys=True,
+                )
+            self.dirty = False
+        except OSError:
+            pass
@@ -2,19 +2,39 @@
 Routines related to PollyXT files
 """
 
+from functools import cached_property, partial
 from pathlib import Path
-from typing import Iterable, Tuple, Union
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from datetime import datetime, timedelta
+from enum import Enum
 
 import numpy as np
-import pandas as pd
 from netCDF4 import Dataset
 
+from pollyxt_pipelines import utils
 from pollyxt_pipelines.polly_to_scc.exceptions import (
     NoFilesFound,
     NoMeasurementsInTimePeriod,
     BadMeasurementTime,
 )
+from pollyxt_pipelines.polly_to_scc.index_cache import IndexCache
+from pollyxt_pipelines.polly_to_scc.backends import fill_value, replace_fill_value
+from pollyxt_pipelines.polly_to_scc.compressed import COMPRESSED_SUFFIXES, ScratchCache
+from pollyxt_pipelines.polly_to_scc.dataset_pool import (
+    DEFAULT_CAPACITY,
+    DatasetPool,
+    open_dataset,
+)
 
 
 def polly_date_to_datetime(timestamp: Tuple[int, int]) -> datetime:
@@ -34,8 +54,48 @@ def polly_date_to_datetime(timestamp: Tuple[int, int]) -> datetime:
     return date + timedelta(seconds=int(seconds))
 
 
+def polly_dates_to_datetime64(
+    measurement_time: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a whole PollyXT `measurement_time` array to timestamps at once. This is the vectorized
+    version of `polly_date_to_datetime`.
+
+    Parameters:
+        measurement_time: PollyXT timestamps, one row per profile in two-integer format (see `polly_date_to_datetime`)
+
+    Returns:
+        A tuple containing 1) the timestamps as a `datetime64[s]` array and 2) a boolean array that
+        is False for rows that don't contain a valid date. Invalid rows are set to `NaT`.
+    """
+
+    measurement_time = np.ma.filled(measurement_time, -1).astype(np.int64)
+    day = measurement_time[:, 0]
+    seconds = measurement_time[:, 1]
+
+    # Split YYYYMMDD into its components and check that they form a real date
+    year = day // 10000
+    month = (day // 100) % 100
+    day_of_month = day % 100
+    valid = (year >= 1000) & (year <= 9999) & (month >= 1) & (month <= 12)
+
+    months = np.where(valid, (year - 1970) * 12 + (month - 1), 0)
+    month_start = months.astype("datetime64[M]").astype("datetime64[D]")
+    days_in_month = (
+        (months + 1).astype("datetime64[M]").astype("datetime64[D]") - month_start
+    ).astype(np.int64)
+    valid &= (day_of_month >= 1) & (day_of_month <= days_in_month)
+
+    timestamps = (
+        month_start.astype("datetime64[s]") + (day_of_month - 1) * 86400 + seconds
+    )
+    timestamps[~valid] = np.datetime64("NaT")
+
+    return timestamps, valid
+
+
 def get_measurement_period(
-    input: Union[Path, Dataset, np.ndarray]
+    input: Union[Path, Dataset, np.ndarray],
 ) -> Tuple[datetime, datetime]:
     """
     Return the measurement time (i.e. start and end times) from a PollyXT file.
@@ -68,12 +128,13 @@ def get_measurement_period(
     assert shape[1] == 2
 
     # Parse start/end times
-    day_str = str(measurement_time[0, 0])
-    date = datetime.strptime(day_str, "%Y%m%d")
-    start = date + timedelta(seconds=int(measurement_time[0, 1]))
-    end = date + timedelta(seconds=int(measurement_time[-1, 1]))
+    timestamps, valid = polly_dates_to_datetime64(measurement_time)
+    if not np.all(valid):
+        raise ValueError(
+            f"Bad measurement time value: {measurement_time[np.argmin(valid)]}"
+        )
 
-    return start, end
+    return timestamps.min().item(), timestamps.max().item()
 
 
 def find_time_indices(
@@ -85,6 +146,11 @@ def find_time_indices(
 
     The `measurement_time` array has two columns, the first contains the date in YYYYMMDD format
     and the second column contains each measurement's delta from the date, in seconds (!).
+
+    The indices are found by binary searching the actual timestamps, so they are correct for any
+    integration time and even if there are gaps in the measurements. The returned range contains
+    the first measurement at or after `start` up to the last measurement at or before `end`
+    (inclusive).
     """
 
     measurement_start, measurement_end = get_measurement_period(measurement_time)
@@ -100,13 +166,246 @@ def find_time_indices(
         raise ValueError(f"Selected end ({end}) is after file end ({mend})!")
 
     # Find indices
-    dt1 = (start - measurement_start).seconds
-    dt2 = (end - measurement_start).seconds
+    timestamps, _ = polly_dates_to_datetime64(measurement_time)
+    index_start = timestamps.searchsorted(np.datetime64(start, "us"), "left")
+    index_end = timestamps.searchsorted(np.datetime64(end, "us"), "right") - 1
+
+    return (int(index_start), int(index_end))
+
+
+def find_gaps(timestamps: np.ndarray, min_gap: timedelta) -> List[Tuple[int, int]]:
+    """
+    Finds the gaps in a sorted array of timestamps, i.e. places where consecutive measurements
+    are more than `min_gap` apart (for example, because of a power outage).
+
+    Parameters:
+        timestamps: Sorted `datetime64` array
+        min_gap: Shortest time difference that counts as a gap
+
+    Returns:
+        A list of (before, after) index pairs: `before` is the last measurement before each gap and
+        `after` is the first measurement after it.
+    """
+
+    before = np.flatnonzero(np.diff(timestamps) > np.timedelta64(min_gap))
+    return [(int(i), int(i) + 1) for i in before]
+
+
+DEFAULT_INTEGRATION_TIME = timedelta(seconds=30)
+"""Integration time of a profile, used when it can't be found from the measurements themselves"""
+
+
+def find_integration_time(timestamps: np.ndarray) -> timedelta:
+    """
+    Finds the integration time of the profiles (i.e. how far apart consecutive measurements are),
+    as the median difference of consecutive timestamps. The median ignores gaps and the occasional
+    late profile. If there are less than two timestamps, `DEFAULT_INTEGRATION_TIME` is returned.
+
+    Parameters:
+        timestamps: Sorted `datetime64` array
+    """
+
+    differences = np.diff(timestamps)
+    differences = differences[differences > np.timedelta64(0)]
+    if differences.shape[0] == 0:
+        return DEFAULT_INTEGRATION_TIME
+
+    median = np.median(differences.astype("timedelta64[us]").astype(np.int64))
+    return timedelta(microseconds=int(median))
+
+
+def find_true_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the runs of consecutive `True` values in a boolean array, for example the calibration
+    periods in a `depol_cal_angle != 0` array.
+
+    Parameters:
+        mask: A boolean array
+
+    Returns:
+        A tuple containing the start and end indices of each run. Both indices are inclusive.
+    """
+
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    return starts, ends
+
+
+class DuplicatePolicy(Enum):
+    """
+    Which file to keep a profile from, when the same timestamp appears in more than one raw file
+    (for example, when files are synced twice from the instrument)
+    """
+
+    NEWEST = "newest"
+    """Keep the file that was modified last"""
+
+    LARGEST = "largest"
+    """Keep the largest file, which is usually the most complete one"""
+
+    @staticmethod
+    def from_string(x: str):
+        x = x.lower().strip()
+        for policy in DuplicatePolicy:
+            if policy.value == x:
+                return policy
+
+        raise ValueError(f"Unknown duplicate policy {x}")
+
+
+class DroppedProfiles(NamedTuple):
+    """
+    Profiles of a raw file that were left out of the index because they are also in a preferred
+    file (see `DuplicatePolicy`)
+    """
+
+    path: Path
+    """The raw file"""
+
+    profiles: int
+    """How many profiles were dropped"""
+
+    start: datetime
+    """Timestamp of the first dropped profile"""
+
+    end: datetime
+    """Timestamp of the last dropped profile"""
+
+
+def rank_files(files: Sequence[Path], policy: DuplicatePolicy) -> np.ndarray:
+    """
+    Orders files by preference, according to the given policy
+
+    Returns:
+        The rank of each file. Files with a higher rank are preferred.
+    """
+
+    stats = [path.stat() for path in files]
+    mtimes = np.array([x.st_mtime_ns for x in stats], dtype=np.int64)
+    sizes = np.array([x.st_size for x in stats], dtype=np.int64)
+
+    # The last key of lexsort is the primary one
+    if policy == DuplicatePolicy.NEWEST:
+        order = np.lexsort((sizes, mtimes))
+    else:
+        order = np.lexsort((mtimes, sizes))
+
+    rank = np.empty(len(files), dtype=np.int64)
+    rank[order] = np.arange(len(files))
+    return rank
+
+
+def deduplicate(
+    timestamps: np.ndarray, file_ids: np.ndarray, file_rank: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts the profiles of many files by time and removes duplicate timestamps. A single sort brings
+    equal timestamps next to each other (with the preferred file first), so no pairwise
+    comparison of files is needed.
+
+    Parameters:
+        timestamps: The timestamp of every profile
+        file_ids: Which file each profile belongs to
+        file_rank: The rank of each file, see `rank_files()`. For equal timestamps, the profile from
+            the file with the highest rank is kept. If ranks are also equal, the first one is kept.
+
+    Returns:
+        A tuple containing 1) the indices of the kept profiles, sorted by time and 2) the indices of
+        the dropped profiles
+    """
+
+    order = np.lexsort((-file_rank[file_ids], timestamps))
+    sorted_timestamps = timestamps[order]
+
+    keep = np.ones(order.shape[0], dtype=bool)
+    keep[1:] = sorted_timestamps[1:] != sorted_timestamps[:-1]
+
+    return order[keep], order[~keep]
+
+
+def find_raw_files(path: Path, recursive: bool = False) -> List[Path]:
+    """
+    Returns the PollyXT netCDF files at the given path. Compressed files (see `COMPRESSED_SUFFIXES`)
+    are included.
+
+    Parameters:
+        path: Either a single file or a directory of files
+        recursive: If true and `path` is a directory, all subdirectories are searched as well (e.g.
+            for archives organized in station/year/month directories).
+
+    Returns:
+        The list of files, sorted by path
+    """
+
+    if path.is_dir():
+        prefix = "**/*" if recursive else "*"
+        files = []
+        for suffix in (".nc",) + COMPRESSED_SUFFIXES:
+            files += [x for x in path.glob(prefix + suffix) if x.is_file()]
+        return sorted(files)
+    elif path.is_file():
+        return [path]
+    else:
+        raise ValueError(f"Path {path} doesn't seem to be either a file or a directory")
+
+
+def read_index_variables(
+    path: Path,
+    pool: Optional[DatasetPool] = None,
+    scratch: Optional[ScratchCache] = None,
+    backend=None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the variables required for indexing a PollyXT file, i.e. `measurement_time` and
+    `depol_cal_angle`.
+
+    Parameters:
+        path: The PollyXT netCDF file to read
+        pool: Optionally, open the file through this pool
+        scratch: Where to decompress the file, if it's compressed and no pool is used
+        backend: How to open the file, if no pool is used (see `backends`)
+
+    Returns:
+        A tuple containing the two variables
+    """
+
+    with open_dataset(path, pool, scratch, backend) as nc:
+        # Missing timestamps are marked as invalid dates and missing angles are not calibration
+        measurement_time = replace_fill_value(
+            nc["measurement_time"][:], nc["measurement_time"], -1
+        )
+        depol_cal_angle = replace_fill_value(
+            nc["depol_cal_angle"][:], nc["depol_cal_angle"], 0.0
+        )
+
+    return measurement_time, depol_cal_angle
+
+
+READ_BLOCK_PROFILES = 256
+"""How many profiles to read at once when only some channels of a variable are needed"""
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+"""Default size limit of the chunks returned by `PollyXTRepository.iter_chunks()`"""
+
+
+class ProfileChunk(NamedTuple):
+    """
+    A time ordered block of profiles, see `PollyXTRepository.iter_chunks()`
+    """
+
+    raw_signal: np.ndarray
+    """The `raw_signal` variable as (time, points, channels), in its original data type"""
 
-    index_start = dt1 // 30
-    index_end = dt2 // 30
+    measurement_shots: np.ndarray
+    """The `measurement_shots` variable as (time, channels)"""
+
+    timestamps: np.ndarray
+    """The time of each profile, as `datetime64[s]`"""
 
-    return (index_start, index_end)
+    calibration_mask: np.ndarray
+    """True for the profiles during depolarization calibration"""
 
 
 class PollyXTRepository:
@@ -115,56 +414,146 @@ class PollyXTRepository:
     files, even across single-file boundaries.
     """
 
-    def __init__(self, path: Path):
+    def __init__(
+        self,
+        path: Path,
+        use_cache: bool = True,
+        recursive: bool = False,
+        workers: int = 1,
+        max_open_files: int = DEFAULT_CAPACITY,
+        scratch: Optional[ScratchCache] = None,
+        duplicates: DuplicatePolicy = DuplicatePolicy.NEWEST,
+        backend=None,
+    ):
         """
         Create a repository
 
         Parameters
             path: Where are the PollyXT netCDF files stored. Can either be a directory of a single file
+            use_cache: If true, the index is read from (and stored to) a sidecar file in each
+                directory, so only new or modified files have to be opened. See `IndexCache`.
+            recursive: If true and `path` is a directory, subdirectories are also searched for files.
+            workers: How many files to read at the same time when building the index. Files are
+                read in separate processes, which hides the latency of opening files over
+                network filesystems.
+            max_open_files: How many raw files to keep open, so they are not reopened for every
+                interval. Call `close()` (or use the repository as a context manager) when done.
+            scratch: Where to decompress compressed raw files. Default is a `ScratchCache` with
+                the default settings. Compressed files are only decompressed when they are read.
+            duplicates: Which file to keep, when some timestamps are in multiple files. The dropped
+                profiles are listed in `dropped`.
+            backend: How to read the raw files (see `backends`). Default is `netCDF4`.
         """
 
         # Create a list of files to include in the repository
         self.path = path
-
-        if self.path.is_dir():
-            self.files = list(self.path.glob("*.nc"))
-        elif self.path.is_file():
-            self.files = [self.path]
-        else:
-            raise ValueError(
-                f"Path {self.path} doesn't seem to be either a file or a directory"
-            )
+        self.files = find_raw_files(self.path, recursive)
 
         if len(self.files) == 0:
             raise NoFilesFound(self.path)
 
-        # Create the index table
-        rows = []
+        self.scratch = scratch if scratch is not None else ScratchCache()
+        self.pool = DatasetPool(max_open_files, self.scratch, backend)
+
+        # Load the index caches (one per directory), if enabled
+        self.caches: Dict[Path, IndexCache] = {}
+        if use_cache:
+            for directory in sorted(set(path.parent for path in self.files)):
+                self.caches[directory] = IndexCache(directory)
+
+        # Read the index variables of every file. Only files that are not in the cache are opened.
+        index_variables = {}
         for path in self.files:
-            with Dataset(path, "r") as nc:
-                measurement_time = nc["measurement_time"][:]
-                depol_cal_angle = nc["depol_cal_angle"][:]
-                for i, (timestamp, dcv) in enumerate(
-                    zip(measurement_time, depol_cal_angle)
-                ):
-                    # Parse date
-                    try:
-                        timestamp = polly_date_to_datetime(timestamp)
-                    except ValueError:
-                        raise BadMeasurementTime(path, timestamp)
-
-                    rows.append(
-                        {
-                            "timestamp": timestamp,
-                            "index": i,
-                            "path": path,
-                            "depol_cal_angle": dcv,
-                        }
-                    )
+            cache = self.caches.get(path.parent)
+            entry = cache.get(path) if cache is not None else None
+            if entry is not None:
+                index_variables[path] = (entry.measurement_time, entry.depol_cal_angle)
+
+        missing = [path for path in self.files if path not in index_variables]
+        if workers > 1:
+            results = utils.parallel_map(
+                partial(
+                    read_index_variables,
+                    scratch=self.scratch,
+                    backend=self.pool.backend,
+                ),
+                missing,
+                workers,
+            )
+        else:
+            results = [read_index_variables(path, self.pool) for path in missing]
+        for path, (measurement_time, depol_cal_angle) in zip(missing, results):
+            index_variables[path] = (measurement_time, depol_cal_angle)
+            if path.parent in self.caches:
+                self.caches[path.parent].put(path, measurement_time, depol_cal_angle)
+
+        for directory, cache in self.caches.items():
+            if self.path.is_dir():
+                cache.retain(
+                    path.name for path in self.files if path.parent == directory
+                )
+            cache.save()
+
+        # Create the index, from the columns of every file. The index is kept as a few flat arrays
+        # (instead of one row per profile), so millions of profiles fit in a few tens of MB.
+        timestamps = []
+        calibration = []
+        for path in self.files:
+            measurement_time, depol_cal_angle = index_variables[path]
+            file_timestamps, valid = polly_dates_to_datetime64(measurement_time)
+            if not np.all(valid):
+                bad_value = measurement_time[np.argmin(valid)]
+                raise BadMeasurementTime(path, bad_value)
+            timestamps.append(file_timestamps)
+            calibration.append(np.ma.filled(depol_cal_angle, 0.0) != 0)
+
+        counts = [x.shape[0] for x in timestamps]
+        timestamps = np.concatenate(timestamps)
+        file_ids = np.repeat(np.arange(len(self.files), dtype=np.int32), counts)
+        order, dropped = deduplicate(
+            timestamps, file_ids, rank_files(self.files, duplicates)
+        )
+
+        # Summarize the dropped profiles of each file
+        self.dropped: List[DroppedProfiles] = []
+        for file_id in np.unique(file_ids[dropped]):
+            file_timestamps = timestamps[dropped[file_ids[dropped] == file_id]]
+            self.dropped.append(
+                DroppedProfiles(
+                    path=self.files[file_id],
+                    profiles=file_timestamps.shape[0],
+                    start=file_timestamps.min().item(),
+                    end=file_timestamps.max().item(),
+                )
+            )
 
-        self.index = pd.DataFrame(rows)
-        self.index = self.index.sort_values("timestamp", ascending=True)
-        self.index["calibration"] = self.index["depol_cal_angle"] != 0
+        # Sorted arrays of the index, used for binary searching by time (see `find_slices()`).
+        # Row `i` is profile `file_indices[i]` of file `files[file_ids[i]]`.
+        self.timestamps = timestamps[order]
+        self.file_ids = file_ids[order]
+        self.file_indices = np.concatenate(
+            [np.arange(n, dtype=np.int32) for n in counts]
+        )[order]
+
+        # Time between consecutive profiles, e.g. for the stop time of each profile
+        self.integration_time = find_integration_time(self.timestamps)
+
+        # Which profiles are during calibration, one bit per row (see `get_calibration_mask()`)
+        calibration = np.concatenate(calibration)[order]
+        self.calibration = np.packbits(calibration)
+
+        # Calibration periods, as (inclusive) index ranges of the sorted arrays
+        self.calibration_starts, self.calibration_ends = find_true_runs(calibration)
+
+    def close(self):
+        """Close any raw files that are still open"""
+        self.pool.close()
+
+    def __enter__(self) -> "PollyXTRepository":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     def get_time_period(self) -> Tuple[datetime, datetime]:
         """
@@ -174,10 +563,27 @@ class PollyXTRepository:
             A tuple containing the first and last available timestamps
         """
 
-        start = self.index.iloc[0]["timestamp"]
-        end = self.index.iloc[-1]["timestamp"]
+        return self.timestamps[0].item(), self.timestamps[-1].item()
 
-        return start, end
+    def get_calibration_mask(self, first: int = 0, last: int = None) -> np.ndarray:
+        """
+        Returns whether each row of the sorted index is during calibration
+
+        Parameters:
+            first: First row to include
+            last: Last row to include (exclusive). Default is the end of the index.
+
+        Returns:
+            A boolean array with one value per row
+        """
+
+        if last is None:
+            last = self.timestamps.shape[0]
+
+        # Only unpack the bytes that contain the requested bits
+        bits = np.unpackbits(self.calibration[first // 8 : (last + 7) // 8])
+        offset = first - (first // 8) * 8
+        return bits[offset : offset + last - first].astype(bool)
 
     def get_calibration_periods(self) -> Iterable[Tuple[datetime, datetime]]:
         """
@@ -190,98 +596,206 @@ class PollyXTRepository:
             List[Tuple[datetime, datetime]]: A list containing periods (ie. tuples of start-time and end-time)
         """
 
-        groups = (self.index.calibration != self.index.calibration.shift()).cumsum()
+        starts = self.timestamps[self.calibration_starts]
+        ends = self.timestamps[self.calibration_ends]
+        for start, end in zip(starts, ends):
+            yield start.item(), end.item()
 
-        for i, g in self.index.groupby(groups):
-            if g.depol_cal_angle.sum() != 0:
-                yield g.iloc[0]["timestamp"], g.iloc[-1]["timestamp"]
+    def get_first_timestamp(self, start: datetime) -> Optional[datetime]:
+        """
+        Returns the timestamp of the first measurement at or after `start`, or `None` if there are
+        no more measurements
+        """
+
+        i = self.timestamps.searchsorted(np.datetime64(start, "us"), "left")
+        if i >= self.timestamps.shape[0]:
+            return None
+        return self.timestamps[i].item()
 
-    def get_pollyxt_file(self, time_start: datetime, time_end: datetime):
+    def get_gaps(self, min_gap: timedelta) -> List[Tuple[datetime, datetime]]:
+        """
+        Returns the periods without any measurements that are longer than `min_gap`.
+
+        Returns:
+            A list of (last measurement before the gap, first measurement after the gap) tuples
         """
-        Create a PollyXTFile for the given time range.
+
+        return [
+            (self.timestamps[before].item(), self.timestamps[after].item())
+            for before, after in find_gaps(self.timestamps, min_gap)
+        ]
+
+    def find_slices(
+        self, time_start: datetime, time_end: datetime
+    ) -> List[Tuple[Path, int, int]]:
+        """
+        Finds which parts of which files contain the measurements of the given time range. The
+        index is binary searched, so this is cheap even for very large repositories.
 
         Parameters:
             time_start: First measurement to include
             time_end: Last measurement to include
 
         Returns:
-            The PollyXTFile file for the requested period.
+            A list of (file, start index, end index) tuples, in time order. Both indices are
+            inclusive. The list is empty if there are no measurements in the time range.
         """
 
-        # Filter index for given time range
-        mask = (self.index["timestamp"] >= time_start) & (
-            self.index["timestamp"] <= time_end
-        )
-        targets = self.index[mask]
-        if targets.shape[0] == 0:
-            raise NoMeasurementsInTimePeriod()
+        first = self.timestamps.searchsorted(np.datetime64(time_start, "us"), "left")
+        last = self.timestamps.searchsorted(np.datetime64(time_end, "us"), "right")
+        return self._slices_for_rows(first, last)
 
-        # Read all files and concat into the requested
-        polly_files = []
-        for path in targets["path"].unique():
-            targets_filtered = targets[targets["path"] == path]
+    def _slices_for_rows(self, first: int, last: int) -> List[Tuple[Path, int, int]]:
+        """
+        Returns the file slices of the rows `first` (inclusive) to `last` (exclusive) of the
+        sorted index. See `find_slices()`.
+        """
 
-            start_index = targets_filtered["index"].min()
-            end_index = targets_filtered["index"].max()
+        if first >= last:
+            return []
 
-            polly_files.append(PollyXTFile(path, start=start_index, end=end_index))
+        file_ids = self.file_ids[first:last]
+        file_indices = self.file_indices[first:last]
 
-        # Concatenate data into one file
-        pollyxt_file = polly_files[0]
-        pollyxt_file.raw_signal = np.concatenate([x.raw_signal for x in polly_files])
-        pollyxt_file.raw_signal_swap = np.concatenate(
-            [x.raw_signal_swap for x in polly_files]
-        )
-        pollyxt_file.measurement_time = np.concatenate(
-            [x.measurement_time for x in polly_files]
+        # Split the rows into runs of consecutive profiles of the same file. Usually there is one
+        # run per file, but there can be more if duplicate profiles were dropped.
+        breaks = (file_ids[1:] != file_ids[:-1]) | (
+            file_indices[1:] != file_indices[:-1] + 1
         )
-        pollyxt_file.measurement_shots = np.concatenate(
-            [x.measurement_shots for x in polly_files]
-        )
-        try:
-            pollyxt_file.zenith_angle = np.concatenate(
-                [x.zenith_angle for x in polly_files]
+        run_starts = np.concatenate([[0], np.flatnonzero(breaks) + 1])
+        run_ends = np.concatenate([run_starts[1:] - 1, [file_ids.shape[0] - 1]])
+
+        return [
+            (
+                self.files[file_ids[start]],
+                int(file_indices[start]),
+                int(file_indices[end]),
             )
-        except ValueError:
-            # Sometimes these arrays are empty, this is not a problem
-            pass
-        pollyxt_file.depol_cal_angle = np.concatenate(
-            [x.depol_cal_angle for x in polly_files]
-        )
+            for start, end in zip(run_starts, run_ends)
+        ]
+
+    def get_pollyxt_file(
+        self,
+        time_start: datetime,
+        time_end: datetime,
+        channels: Optional[Sequence[int]] = None,
+        max_points: Optional[int] = None,
+    ):
+        """
+        Create a PollyXTFile for the given time range.
 
-        pollyxt_file.calibration_mask = np.concatenate(
-            [x.calibration_mask for x in polly_files]
+        Parameters:
+            time_start: First measurement to include
+            time_end: Last measurement to include
+            channels: Optionally, only read these channels (see `PollyXTFile`)
+            max_points: Optionally, only read this many range bins (see `PollyXTFile`)
+
+        Returns:
+            The PollyXTFile file for the requested period.
+        """
+
+        slices = self.find_slices(time_start, time_end)
+        if len(slices) == 0:
+            raise NoMeasurementsInTimePeriod()
+
+        return PollyXTFile.from_slices(
+            slices, pool=self.pool, channels=channels, max_points=max_points
         )
 
-        pollyxt_file.end_date = polly_files[-1].end_date
+    def iter_chunks(
+        self,
+        time_start: Optional[datetime] = None,
+        time_end: Optional[datetime] = None,
+        max_bytes: int = DEFAULT_CHUNK_BYTES,
+        channels: Optional[Sequence[int]] = None,
+        max_points: Optional[int] = None,
+    ) -> Iterator[ProfileChunk]:
+        """
+        Iterates over the profiles of a time range in time ordered chunks. Each chunk holds at most
+        `max_bytes` of data (but always at least one profile), so arbitrarily long periods can be
+        processed with constant memory.
 
-        return pollyxt_file
+        Parameters:
+            time_start: First measurement to include. Default is the start of the repository.
+            time_end: Last measurement to include. Default is the end of the repository.
+            max_bytes: Size limit of each chunk
+            channels: Optionally, only read these channels (see `PollyXTFile`)
+            max_points: Optionally, only read this many range bins (see `PollyXTFile`)
+        """
+
+        first = 0
+        last = self.timestamps.shape[0]
+        if time_start is not None:
+            first = self.timestamps.searchsorted(
+                np.datetime64(time_start, "us"), "left"
+            )
+        if time_end is not None:
+            last = self.timestamps.searchsorted(np.datetime64(time_end, "us"), "right")
+        if first >= last:
+            return
+
+        # Size of one profile, from the header of the first file
+        with open_dataset(self.files[self.file_ids[first]], self.pool) as nc:
+            raw_signal = nc["raw_signal"]
+            shots = nc["measurement_shots"]
+            points = raw_signal.shape[1]
+            if max_points is not None:
+                points = min(points, max_points)
+            n_channels = raw_signal.shape[-1] if channels is None else len(channels)
+            profile_bytes = (
+                points * n_channels * raw_signal.dtype.itemsize
+                + n_channels * shots.dtype.itemsize
+                + np.dtype("datetime64[s]").itemsize
+                + np.dtype(bool).itemsize
+            )
+        chunk_profiles = max(1, max_bytes // profile_bytes)
+
+        for row in range(first, last, chunk_profiles):
+            slices = self._slices_for_rows(row, min(row + chunk_profiles, last))
+            pf = PollyXTFile.from_slices(
+                slices, pool=self.pool, channels=channels, max_points=max_points
+            )
+            timestamps, _ = polly_dates_to_datetime64(pf.measurement_time)
+            yield ProfileChunk(
+                raw_signal=pf.raw_signal,
+                measurement_shots=pf.measurement_shots,
+                timestamps=timestamps,
+                calibration_mask=pf.calibration_mask,
+            )
 
 
 class PollyXTFile:
     """
     Reads the variables of interest from a PollyXT netCDF file.
+
+    Variables are read lazily, i.e. the first time they are accessed. This way, code that only needs
+    the timestamps or the calibration information never reads the (large) `raw_signal` variable.
     """
 
-    start_date: datetime
     start_index: int
     end_index: int
-    end_date: datetime
 
-    raw_signal: np.ndarray
-    raw_signal_swap: np.ndarray
+    slices: List[Tuple[Path, int, int]]
+    """Which part of which file(s) this object refers to, as (file, start, end) tuples (inclusive)"""
 
-    measurement_time: np.ndarray
-    measurement_shots: np.ndarray
-    zenith_angle: np.ndarray
-    location_coordinates: np.ndarray
-    depol_cal_angle: np.ndarray
-
-    # True where the depol_cal_angle is not 0, ie. where the system is doing a calibration
-    # Same size as `raw_signal*`, `measurement_time` and `measurement_shots`
-    calibration_mask: np.ndarray
+    channels: Optional[List[int]]
+    """
+    Which channels were read, in ascending order. The channel axis of `raw_signal` and
+    `measurement_shots` follows this order (use `channel_index()`). `None` means all channels.
+    """
 
-    def __init__(self, input_path: Path, start: int = None, end: int = None):
+    max_points: Optional[int]
+    """Only the first `max_points` range bins of `raw_signal` are read. `None` means all bins."""
+
+    def __init__(
+        self,
+        input_path: Path,
+        start: int = None,
+        end: int = None,
+        pool: Optional[DatasetPool] = None,
+        channels: Optional[Sequence[int]] = None,
+        max_points: Optional[int] = None,
+    ):
         """
         Read a PollyXT netcdf file
 
@@ -289,37 +803,288 @@ class PollyXTFile:
             input_path: Which file to read
             start: Optionally, trim the file from this index
             end: Optionally, trim file until this index
+            pool: Optionally, open the file through this pool instead of opening it for every read
+            channels: Optionally, only read these channels of `raw_signal` and `measurement_shots`
+            max_points: Optionally, only read the first `max_points` range bins of `raw_signal`
+        """
+
+        self.pool = pool
+        self.channels = sorted(set(channels)) if channels is not None else None
+        self.max_points = max_points
+        self._set_slices([(input_path, start, end)])
+
+    @classmethod
+    def from_slices(
+        cls,
+        slices: List[Tuple[Path, int, int]],
+        pool: Optional[DatasetPool] = None,
+        channels: Optional[Sequence[int]] = None,
+        max_points: Optional[int] = None,
+    ) -> "PollyXTFile":
+        """
+        Read parts of one or more PollyXT netCDF files as one file. The data are read directly into
+        their final arrays, so no intermediate copies are made when merging files.
+
+        Parameters:
+            slices: List of (file, start index, end index) tuples, in time order. Both indices
+                are inclusive (see `PollyXTRepository.find_slices()`).
+            pool: Optionally, open the files through this pool
+            channels: Optionally, only read these channels of `raw_signal` and `measurement_shots`
+            max_points: Optionally, only read the first `max_points` range bins of `raw_signal`
         """
 
-        # Read the file
-        nc = Dataset(input_path, "r")
+        pf = cls.__new__(cls)
+        pf.pool = pool
+        pf.channels = sorted(set(channels)) if channels is not None else None
+        pf.max_points = max_points
+        pf._set_slices(slices)
+        return pf
 
-        # Read measurement time and trim accoarding to the user provided indices
-        self.measurement_time = nc["measurement_time"][:]
-        if start is None:
-            start = 0
-        if end is None:
-            end = self.measurement_time.shape[0]
+    def channel_index(self, channel: int) -> int:
+        """
+        Returns the position of a raw file channel in the channel axis of `raw_signal` and
+        `measurement_shots`.
 
-        self.measurement_time = self.measurement_time[start : end + 1]
+        Raises:
+            ValueError: If the channel was not read
+        """
 
-        # Read the rest of the variables
-        # raw_signal is converted to float64 because it is required by SCC
-        self.raw_signal = nc["raw_signal"][start : end + 1, :, :]
-        self.raw_signal = np.array(self.raw_signal, dtype=np.float64)
-        self.raw_signal_swap = np.swapaxes(self.raw_signal, 1, 2)
+        if self.channels is None:
+            return channel
+        return self.channels.index(channel)
 
-        self.measurement_shots = nc["measurement_shots"][start : end + 1, :]
-        self.zenith_angle = nc["zenithangle"][:]
-        self.location_coordinates = nc["location_coordinates"][:]
-        self.depol_cal_angle = nc["depol_cal_angle"][start : end + 1]
+    def load(self, raw_signal: bool = True):
+        """
+        Reads every variable that is needed for writing SCC files now, instead of on first access.
+        Afterwards, the object can be sent to another process (see `prefetch`).
 
-        nc.close()
+        Parameters:
+            raw_signal: Set to False to skip `raw_signal`, e.g. when it will be read in parts (see
+                `split()`)
+        """
+
+        self.measurement_time
+        if raw_signal:
+            self.raw_signal
+        self.raw_signal_shape
+        self.raw_signal_fill_value
+        self.measurement_shots
+        self.depol_cal_angle
+        self.zenith_angle
+        self.location_coordinates
+
+    def split(self, profiles: int) -> Iterator[Tuple[int, "PollyXTFile"]]:
+        """
+        Splits the file into consecutive parts of up to `profiles` profiles, with the same channels
+        and range bins. Each part reads its variables separately, only when they are accessed, so a
+        long time period can be processed part by part with little memory.
+
+        Returns:
+            An iterator of (index of the first profile of the part, part) tuples
+        """
+
+        # Position of each slice inside this file
+        offsets = np.cumsum([0] + [end - start + 1 for _, start, end in self.slices])
+
+        for first in range(0, self.profiles, profiles):
+            last = min(first + profiles, self.profiles) - 1
+            slices = []
+            for (path, start, _), offset, next_offset in zip(
+                self.slices, offsets, offsets[1:]
+            ):
+                if next_offset <= first or last < offset:
+                    continue
+                slices.append(
+                    (
+                        path,
+                        start + max(first - offset, 0),
+                        start + min(last, next_offset - 1) - offset,
+                    )
+                )
 
-        self.calibration_mask = self.depol_cal_angle != 0.0
+            yield first, PollyXTFile.from_slices(
+                slices, self.pool, self.channels, self.max_points
+            )
+
+    def __getstate__(self):
+        # Open files can't be pickled and views would be pickled as copies
+        state = self.__dict__.copy()
+        state["pool"] = None
+        state.pop("raw_signal_swap", None)
+        return state
+
+    def _set_slices(self, slices: List[Tuple[Path, int, int]]):
+        """
+        Resolves the given slices against the actual file lengths. Only the file headers are read.
+        """
+
+        self.slices = []
+        for path, start, end in slices:
+            with open_dataset(path, self.pool) as nc:
+                length = nc["measurement_time"].shape[0]
+
+            # Trim accoarding to the user provided indices
+            if start is None:
+                start = 0
+            if end is None:
+                end = length
+            self.slices.append((path, start, min(end, length - 1)))
+
+        self.start_index = self.slices[0][1]
+        self.end_index = self.slices[0][2]
+        self.profiles = sum(end - start + 1 for _, start, end in self.slices)
+
+    def _read_profiles(
+        self, name: str, by_channel: bool = False, by_point: bool = False
+    ) -> np.ndarray:
+        """
+        Reads a variable with a time dimension from all slices. The output is allocated once and
+        each file's slice is copied into it.
 
-        # Store some variables for easy access
-        self.start_index = start
-        self.end_index = end
-        self.start_date = polly_date_to_datetime(self.measurement_time[0, :])
-        self.end_date = polly_date_to_datetime(self.measurement_time[-1, :])
+        If `by_channel` is set, the last dimension of the variable is the channel and only the
+        selected `channels` are kept. The range between the first and last selected channel is read
+        in blocks of `READ_BLOCK_PROFILES` profiles, so only a small part of the unselected channels
+        is ever in memory.
+
+        If `by_point` is set, the second dimension of the variable is the range bin and it is
+        trimmed to `max_points`.
+        """
+
+        channels = self.channels if by_channel else None
+        # Index of the range bin dimension, empty for variables that don't have one
+        points = (slice(0, self.max_points),) if by_point else ()
+
+        output = None
+        offset = 0
+        for path, start, end in self.slices:
+            with open_dataset(path, self.pool) as nc:
+                variable = nc[name]
+                if output is None:
+                    shape = list(variable.shape)
+                    shape[0] = self.profiles
+                    if by_point:
+                        shape[1] = len(range(shape[1])[points[0]])
+                    if channels is not None:
+                        shape[-1] = len(channels)
+                    output = np.empty(shape, dtype=variable.dtype)
+
+                count = end - start + 1
+                if channels is None:
+                    output[offset : offset + count] = variable[
+                        (slice(start, end + 1),) + points
+                    ]
+                else:
+                    first, last = channels[0], channels[-1] + 1
+                    positions = np.array(channels) - first
+                    for block in range(0, count, READ_BLOCK_PROFILES):
+                        block_count = min(READ_BLOCK_PROFILES, count - block)
+                        block_start = start + block
+                        data = variable[
+                            (slice(block_start, block_start + block_count),)
+                            + points
+                            + (..., slice(first, last))
+                        ]
+                        output[offset + block : offset + block + block_count] = data[
+                            ..., positions
+                        ]
+                offset += count
+
+        return output
+
+    @cached_property
+    def measurement_time(self) -> np.ndarray:
+        """The `measurement_time` variable, see `polly_date_to_datetime` for the format"""
+        return self._read_profiles("measurement_time")
+
+    @cached_property
+    def raw_signal(self) -> np.ndarray:
+        """
+        The `raw_signal` variable, as (time, points, channels). The data type is the same as in the
+        netCDF file (usually integers). Conversion to float64, which SCC requires, is done while
+        writing the SCC file.
+        """
+        return self._read_profiles("raw_signal", by_channel=True, by_point=True)
+
+    @cached_property
+    def raw_signal_shape(self) -> Tuple[int, int, int]:
+        """The shape of `raw_signal`, as (time, points, channels), without reading it"""
+
+        if "raw_signal" in vars(self):
+            return self.raw_signal.shape
+
+        with open_dataset(self.slices[0][0], self.pool) as nc:
+            _, points, channels = nc["raw_signal"].shape
+        points = len(range(points)[: self.max_points])
+        if self.channels is not None:
+            channels = len(self.channels)
+        return self.profiles, points, channels
+
+    @cached_property
+    def raw_signal_swap(self) -> np.ndarray:
+        """View of `raw_signal` as (time, channels, points), which is the SCC order"""
+        return np.swapaxes(self.raw_signal, 1, 2)
+
+    @cached_property
+    def measurement_shots(self) -> np.ndarray:
+        """The `measurement_shots` variable, as (time, channels)"""
+        return self._read_profiles("measurement_shots", by_channel=True)
+
+    @cached_property
+    def raw_signal_fill_value(self):
+        """
+        The value of missing data in `raw_signal` (see `backends.fill_value()`). Since `raw_signal`
+        is read in its original data type, these values are only replaced when writing.
+        """
+        with open_dataset(self.slices[0][0], self.pool) as nc:
+            return fill_value(nc["raw_signal"])
+
+    @cached_property
+    def depol_cal_angle(self) -> np.ndarray:
+        """The `depol_cal_angle` variable. Missing values are replaced by 0."""
+        depol_cal_angle = self._read_profiles("depol_cal_angle")
+        with open_dataset(self.slices[0][0], self.pool) as nc:
+            return replace_fill_value(depol_cal_angle, nc["depol_cal_angle"], 0.0)
+
+    @cached_property
+    def calibration_mask(self) -> np.ndarray:
+        """
+        True where the depol_cal_angle is not 0, ie. where the system is doing a calibration
+        Same size as `raw_signal*`, `measurement_time` and `measurement_shots`
+        """
+        return self.depol_cal_angle != 0.0
+
+    @cached_property
+    def zenith_angle(self) -> np.ndarray:
+        """The `zenithangle` variable"""
+        zenith_angles = []
+        for path, _, _ in self.slices:
+            with open_dataset(path, self.pool) as nc:
+                zenith_angles.append(nc["zenithangle"][:])
+
+        try:
+            return np.concatenate(zenith_angles)
+        except ValueError:
+            # Sometimes these arrays are empty, this is not a problem
+            return zenith_angles[0]
+
+    @cached_property
+    def location_coordinates(self) -> np.ndarray:
+        """The `location_coordinates` variable (of the first file)"""
+        with open_dataset(self.slices[0][0], self.pool) as nc:
+            return nc["location_coordinates"][:]
+
+    @cached_property
+    def integration_time(self) -> timedelta:
+        """Time between consecutive profiles, see `find_integration_time()`"""
+        timestamps, _ = polly_dates_to_datetime64(self.measurement_time)
+        return find_integration_time(timestamps)
+
+    @cached_property
+    def start_date(self) -> datetime:
+        """Timestamp of the first profile"""
+        return polly_date_to_datetime(self.measurement_time[0, :])
+
+    @cached_property
+    def end_date(self) -> datetime:
+        """Timestamp of the last profile"""
+        return polly_date_to_datetime(self.measurement_time[-1, :])
@@ -0,0 +1,217 @@
+"""
+Read-ahead of raw data during conversion
+
+Reading raw files is mostly I/O bound while writing SCC files is mostly compression bound, so
+the two can overlap: while one output file is being written, the data of the next ones are read
+in the background. Since the netCDF/HDF5 libraries are not thread-safe, reading happens in a
+separate process, which has its own open files and sends back loaded `PollyXTFile` objects.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pollyxt_pipelines import utils
+from pollyxt_pipelines.polly_to_scc.compressed import ScratchCache
+from pollyxt_pipelines.polly_to_scc.dataset_pool import DEFAULT_CAPACITY, DatasetPool
+from pollyxt_pipelines.polly_to_scc.pollyxt import PollyXTFile
+
+
+class ReadTask(NamedTuple):
+    """
+    The raw data needed for one output file (or, for calibrations, a pair of files)
+    """
+
+    start: datetime
+    """Start of the time range"""
+
+    end: datetime
+    """End of the time range"""
+
+    slices: List[Tuple[Path, int, int]]
+    """Which parts of the raw files to read (see `PollyXTRepository.find_slices()`)"""
+
+    channels: Optional[List[int]] = None
+    """Which channels to read (see `PollyXTFile`)"""
+
+    max_points: Optional[int] = None
+    """How many range bins to read (see `PollyXTFile`)"""
+
+    calibration: bool = False
+    """True if the data are for calibration files"""
+
+    stream_profiles: Optional[int] = None
+    """
+    If set, `raw_signal` is not read with the other variables, but in parts of this many profiles
+    while writing (see `create_scc_netcdf()`)
+    """
+
+
+class Timings:
+    """
+    Where the time was spent during conversion
+    """
+
+    def __init__(self):
+        self.read = 0.0
+        """Seconds spent reading raw data, in the background or not"""
+
+        self.wait = 0.0
+        """Seconds spent waiting for raw data to be read"""
+
+        self.write = 0.0
+        """Seconds spent writing SCC files"""
+
+    @property
+    def overlap(self) -> float:
+        """The fraction of reading that happened while writing (between 0 and 1)"""
+
+        if self.read == 0:
+            return 0.0
+        return min(max(1 - self.wait / self.read, 0.0), 1.0)
+
+
+def read_task(task: ReadTask, pool: Optional[DatasetPool] = None) -> PollyXTFile:
+    """
+    Reads the raw data of a task
+
+    Parameters:
+        task: What to read
+        pool: Optionally, open the raw files through this pool
+    """
+
+    pf = PollyXTFile.from_slices(
+        task.slices, pool=pool, channels=task.channels, max_points=task.max_points
+    )
+    pf.load(raw_signal=task.stream_profiles is None)
+    return pf
+
+
+# The open files of the background process
+_worker_pool: Optional[DatasetPool] = None
+
+
+def _init_worker(max_open_files: int, scratch: Optional[ScratchCache], backend):
+    global _worker_pool
+    _worker_pool = DatasetPool(max_open_files, scratch, backend)
+
+
+def worker_pool() -> Optional[DatasetPool]:
+    """
+    Returns the open files of the current background process (see `start_workers()`), or `None`
+    outside of one
+    """
+    return _worker_pool
+
+
+def start_workers(
+    workers: int, pool: Optional[DatasetPool] = None
+) -> ProcessPoolExecutor:
+    """
+    Starts background processes for reading raw files. Each process opens up to as many files as
+    `pool`, with the same scratch cache and backend, and can get them with `worker_pool()`.
+
+    Parameters:
+        workers: How many processes to start
+        pool: The open files of the main process, whose settings are copied
+    """
+
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(
+            pool.capacity if pool is not None else DEFAULT_CAPACITY,
+            pool.scratch if pool is not None else None,
+            pool.backend if pool is not None else None,
+        ),
+    )
+
+
+def _read_in_worker(task: ReadTask) -> Tuple[PollyXTFile, float]:
+    start = time.perf_counter()
+    pf = read_task(task, _worker_pool)
+    return pf, time.perf_counter() - start
+
+
+class Prefetcher:
+    """
+    Reads the data of a sequence of tasks ahead of time, in a background process. Use it as a
+    context manager and iterate over it to get each task together with its `PollyXTFile`, in the
+    original order.
+    """
+
+    def __init__(
+        self,
+        tasks: Iterable[ReadTask],
+        depth: int = 1,
+        pool: Optional[DatasetPool] = None,
+        timings: Optional[Timings] = None,
+    ):
+        """
+        Parameters:
+            tasks: What to read. This can be a generator, tasks are only taken when needed.
+            depth: How many tasks to read ahead. Each task in flight holds its data in memory. If 0,
+                the tasks are read in this process when requested.
+            pool: The open files to use when `depth` is 0. The background process opens up to as
+                many files as this pool.
+            timings: Optionally, add the reading and waiting times here
+        """
+
+        self.tasks = iter(tasks)
+        self.depth = depth
+        self.pool = pool
+        self.timings = timings if timings is not None else Timings()
+        self.executor = None
+        self.queue: Deque[Tuple[ReadTask, Future]] = deque()
+        """Tasks that were submitted to the background process but not handed over yet"""
+        if depth > 0:
+            self.executor = start_workers(1, pool)
+
+    def __iter__(self) -> Iterator[Tuple[ReadTask, PollyXTFile]]:
+        if self.executor is None:
+            for task in self.tasks:
+                start = time.perf_counter()
+                pf = read_task(task, self.pool)
+                elapsed = time.perf_counter() - start
+                self.timings.read += elapsed
+                self.timings.wait += elapsed
+                yield task, pf
+            return
+
+        self._fill()
+        while len(self.queue) > 0:
+            task, future = self.queue.popleft()
+            start = time.perf_counter()
+            pf, elapsed = future.result()
+            self.timings.wait += time.perf_counter() - start
+            self.timings.read += elapsed
+            pf.pool = self.pool  # For anything that is read later, e.g. streamed parts
+
+            # Start reading the next task before handing this one over
+            self._fill()
+            yield task, pf
+
+    def _fill(self):
+        """Submit tasks until `depth` of them are in flight (or there are no more tasks)"""
+
+        while len(self.queue) < self.depth:
+            task = next(self.tasks, None)
+            if task is None:
+                return
+            self.queue.append((task, self.executor.submit(_read_in_worker, task)))
+
+    def close(self):
+        """Stop the background process"""
+        if self.executor is not None:
+            # Don't read tasks that were never handed over
+            utils.shutdown_pool(self.executor, (future for _, future in self.queue))
+            self.executor = None
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
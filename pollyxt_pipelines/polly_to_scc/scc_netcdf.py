@@ -2,22 +2,40 @@
 Routines for converting PollyXT files to SCC files
 """
 
+import bisect
+import time
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from enum import Enum, IntEnum
 
 from netCDF4 import Dataset
 import numpy as np
 
 from pollyxt_pipelines.polly_to_scc import pollyxt
-from pollyxt_pipelines.locations import Location
+from pollyxt_pipelines.locations import CALIBRATION_BACKGROUND_HIGH, Location
 from pollyxt_pipelines import utils
-from pollyxt_pipelines.polly_to_scc.exceptions import (
-    NoMeasurementsInTimePeriod,
-    TimeOutsideFile,
+from pollyxt_pipelines.polly_to_scc.dataset_pool import DatasetPool
+from pollyxt_pipelines.polly_to_scc.exceptions import TimeOutsideFile
+from pollyxt_pipelines.polly_to_scc.manifest import Manifest
+from pollyxt_pipelines.polly_to_scc.prefetch import (
+    Prefetcher,
+    ReadTask,
+    Timings,
+    read_task,
+    start_workers,
+    worker_pool,
 )
 
+RAW_LIDAR_DATA_CHUNK_PROFILES = 64
+"""
+How many profiles to convert to float64 at once while writing `Raw_Lidar_Data`. Raw signals are
+kept in their original data type until they are written, so only this many profiles are ever
+converted at the same time.
+"""
+
 
 class Wavelength(Enum):
     """Laser wavelength"""
@@ -51,20 +69,150 @@ class Atmosphere(IntEnum):
         raise ValueError(f"Unknown atmosphere {x}")
 
 
+class Compression(NamedTuple):
+    """
+    How the variables of SCC files are compressed. The default matches the `netCDF4` defaults: zlib
+    level 4 with the shuffle filter and one profile per chunk.
+    """
+
+    level: int = 4
+    """zlib compression level, from 1 (fastest) to 9 (smallest). Use 0 to disable compression."""
+
+    shuffle: bool = True
+    """Use the shuffle filter, which usually makes compressed files smaller"""
+
+    chunk_profiles: Optional[int] = None
+    """
+    How many profiles to store in each chunk of `Raw_Lidar_Data`. Every chunk contains all channels
+    and range bins. If `None`, the netCDF library decides (currently one profile).
+    """
+
+    @staticmethod
+    def from_mode(mode: str) -> "Compression":
+        """
+        Returns the settings of a compression mode: `default`, `fast` (zlib level 1, for when write
+        speed matters more than size) or `none` (no compression, for local pipelines)
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+
+        mode = mode.lower().strip()
+        if mode == "default":
+            return Compression()
+        if mode == "fast":
+            return Compression(level=1)
+        if mode == "none":
+            return Compression(level=0, shuffle=False)
+
+        raise ValueError(f"Unknown compression mode {mode}")
+
+    def options(self) -> Dict[str, object]:
+        """Returns the compression arguments for `Dataset.createVariable()`"""
+
+        if self.level == 0:
+            return {"zlib": False, "shuffle": False}
+        return {"zlib": True, "complevel": self.level, "shuffle": self.shuffle}
+
+    def raw_lidar_data_chunks(self, nc: Dataset) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the chunk sizes of `Raw_Lidar_Data` for the given file, whose dimensions must
+        already exist
+        """
+
+        if self.chunk_profiles is None:
+            return None
+
+        # Chunks can't be larger than a fixed time dimension (e.g. in calibration files)
+        profiles = self.chunk_profiles
+        time = nc.dimensions["time"]
+        if not time.isunlimited():
+            profiles = min(profiles, len(time))
+
+        return (
+            profiles,
+            len(nc.dimensions["channels"]),
+            len(nc.dimensions["points"]),
+        )
+
+
+def raw_signal_as_float(raw_signal: np.ndarray, fill_value=None) -> np.ndarray:
+    """
+    Converts (part of) a raw signal to float64, replacing missing values with NaN.
+
+    Parameters:
+        raw_signal: The raw signal, in any data type
+        fill_value: The value of missing data (see `PollyXTFile.raw_signal_fill_value`), if any
+    """
+
+    data = raw_signal.astype(np.float64)
+    if fill_value is not None:
+        data[raw_signal == fill_value] = np.nan
+    return data
+
+
+def write_raw_lidar_data(
+    variable,
+    raw_signal_swap: np.ndarray,
+    profiles: np.ndarray,
+    fill_value=None,
+    offset: int = 0,
+):
+    """
+    Writes the selected profiles of a raw signal into the `Raw_Lidar_Data` variable of an SCC file,
+    converting them to float64 in chunks of `RAW_LIDAR_DATA_CHUNK_PROFILES` profiles. The profiles
+    are gathered directly into one reused buffer, so nothing larger than a chunk is allocated.
+
+    Parameters:
+        variable: The netCDF variable to write to
+        raw_signal_swap: The raw signal, as (time, channels, points), in any data type
+        profiles: Indices of the profiles (along the time axis) to write
+        fill_value: Values of the raw signal that are written as NaN
+        offset: Where to write the first profile in the variable
+    """
+
+    chunk_profiles = min(RAW_LIDAR_DATA_CHUNK_PROFILES, profiles.shape[0])
+    buffer = np.empty((chunk_profiles,) + raw_signal_swap.shape[1:], dtype=np.float64)
+    if fill_value is not None:
+        is_fill = np.empty(buffer.shape, dtype=bool)
+
+    for position in range(0, profiles.shape[0], RAW_LIDAR_DATA_CHUNK_PROFILES):
+        chunk = profiles[position : position + RAW_LIDAR_DATA_CHUNK_PROFILES]
+        data = buffer[: chunk.shape[0]]
+        for i, profile in enumerate(chunk):
+            data[i] = raw_signal_swap[profile]
+
+        if fill_value is not None:
+            mask = is_fill[: chunk.shape[0]]
+            np.equal(data, fill_value, out=mask)
+            np.copyto(data, np.nan, where=mask)
+
+        start = offset + position
+        variable[start : start + chunk.shape[0]] = data
+
+
 def create_scc_netcdf(
     pf: pollyxt.PollyXTFile,
     output_path: Path,
     location: Location,
     atmosphere=Atmosphere.STANDARD_ATMOSPHERE,
+    compression: Optional[Compression] = None,
+    stream_profiles: Optional[int] = None,
 ) -> Tuple[str, Path]:
     """
     Convert a PollyXT netCDF file to a SCC file.
 
     Parameters:
         pf: An opened PollyXT file. When you create this, you can specify the time period of interest.
+            All channels and range bins of `pf` are written, so it should be created with
+            `location.channels` and `location.max_points`.
         output_path: Where to store the produced netCDF file
         location: Where did this measurement take place
         atmosphere: What kind of atmosphere to use.
+        compression: How to compress the variables. Default is `Compression()`.
+        stream_profiles: Optionally, if `raw_signal` hasn't been read yet, read and write it in parts
+            of this many profiles (see `PollyXTFile.split()`). Only one part is in memory at a
+            time, so files of any length can be written with a fixed amount of memory.
 
     Note:
         If atmosphere is set to Atmosphere.SOUNDING, the `Sounding_File_Name` attribute will be set to
@@ -75,8 +223,11 @@ def create_scc_netcdf(
         A tuple containing  the measurement ID and the output path
     """
 
+    if compression is None:
+        compression = Compression()
+
     # Calculate measurement ID
-    measurement_id = pf.start_date.strftime(f"%Y%m%d{location.scc_code}%H%M")
+    measurement_id = get_measurement_id(location, pf.start_date)
 
     # Create SCC file
     # Output filename is always the measurement ID
@@ -84,8 +235,9 @@ def create_scc_netcdf(
     nc = Dataset(output_filename, "w")
 
     # Create dimensions (mandatory!)
-    nc.createDimension("points", np.size(pf.raw_signal, axis=1))
-    nc.createDimension("channels", np.size(pf.raw_signal, axis=2))
+    _, points, channels = pf.raw_signal_shape
+    nc.createDimension("points", points)
+    nc.createDimension("channels", channels)
     nc.createDimension("time", None)
     nc.createDimension("nb_of_time_scales", 1)
     nc.createDimension("scan_angles", 1)
@@ -115,64 +267,103 @@ def create_scc_netcdf(
 
     # Create Variables. (mandatory)
     raw_data_start_time = nc.createVariable(
-        "Raw_Data_Start_Time", "i4", dimensions=("time", "nb_of_time_scales"), zlib=True
+        "Raw_Data_Start_Time",
+        "i4",
+        dimensions=("time", "nb_of_time_scales"),
+        **compression.options(),
     )
     raw_data_stop_time = nc.createVariable(
-        "Raw_Data_Stop_Time", "i4", dimensions=("time", "nb_of_time_scales"), zlib=True
+        "Raw_Data_Stop_Time",
+        "i4",
+        dimensions=("time", "nb_of_time_scales"),
+        **compression.options(),
     )
     raw_lidar_data = nc.createVariable(
-        "Raw_Lidar_Data", "f8", dimensions=("time", "channels", "points"), zlib=True
+        "Raw_Lidar_Data",
+        "f8",
+        dimensions=("time", "channels", "points"),
+        chunksizes=compression.raw_lidar_data_chunks(nc),
+        **compression.options(),
     )
     channel_id = nc.createVariable(
-        "channel_ID", "i4", dimensions=("channels"), zlib=True
+        "channel_ID", "i4", dimensions=("channels"), **compression.options()
     )
     id_timescale = nc.createVariable(
-        "id_timescale", "i4", dimensions=("channels"), zlib=True
+        "id_timescale", "i4", dimensions=("channels"), **compression.options()
     )
     laser_pointing_angle = nc.createVariable(
-        "Laser_Pointing_Angle", "f8", dimensions=("scan_angles"), zlib=True
+        "Laser_Pointing_Angle",
+        "f8",
+        dimensions=("scan_angles"),
+        **compression.options(),
     )
     laser_pointing_angle_of_profiles = nc.createVariable(
         "Laser_Pointing_Angle_of_Profiles",
         "i4",
         dimensions=("time", "nb_of_time_scales"),
-        zlib=True,
+        **compression.options(),
     )
     laser_shots = nc.createVariable(
-        "Laser_Shots", "i4", dimensions=("time", "channels"), zlib=True
+        "Laser_Shots", "i4", dimensions=("time", "channels"), **compression.options()
     )
     background_low = nc.createVariable(
-        "Background_Low", "f8", dimensions=("channels"), zlib=True
+        "Background_Low", "f8", dimensions=("channels"), **compression.options()
     )
     background_high = nc.createVariable(
-        "Background_High", "f8", dimensions=("channels"), zlib=True
+        "Background_High", "f8", dimensions=("channels"), **compression.options()
+    )
+    molecular_calc = nc.createVariable(
+        "Molecular_Calc", "i4", dimensions=(), **compression.options()
+    )
+    nc.createVariable(
+        "Pol_Calib_Range_Min", "f8", dimensions=("channels"), **compression.options()
+    )
+    nc.createVariable(
+        "Pol_Calib_Range_Max", "f8", dimensions=("channels"), **compression.options()
     )
-    molecular_calc = nc.createVariable("Molecular_Calc", "i4", dimensions=(), zlib=True)
-    nc.createVariable("Pol_Calib_Range_Min", "f8", dimensions=("channels"), zlib=True)
-    nc.createVariable("Pol_Calib_Range_Max", "f8", dimensions=("channels"), zlib=True)
     pressure_at_lidar_station = nc.createVariable(
-        "Pressure_at_Lidar_Station", "f8", dimensions=(), zlib=True
+        "Pressure_at_Lidar_Station", "f8", dimensions=(), **compression.options()
     )
     temperature_at_lidar_station = nc.createVariable(
-        "Temperature_at_Lidar_Station", "f8", dimensions=(), zlib=True
+        "Temperature_at_Lidar_Station", "f8", dimensions=(), **compression.options()
+    )
+    lr_input = nc.createVariable(
+        "LR_Input", "i4", dimensions=("channels"), **compression.options()
     )
-    lr_input = nc.createVariable("LR_Input", "i4", dimensions=("channels"), zlib=True)
 
     # Fill Variables with Data. (mandatory)
-    raw_data_start_time[:] = (
-        pf.measurement_time[~pf.calibration_mask, 1] - pf.measurement_time[0, 1]
-    )
-    raw_data_stop_time[:] = (
-        pf.measurement_time[~pf.calibration_mask, 1] - pf.measurement_time[0, 1]
-    ) + 30
-    raw_lidar_data[:] = pf.raw_signal_swap[~pf.calibration_mask]
+    # Calibration profiles are not included, so select the remaining ones once
+    profiles = np.flatnonzero(~pf.calibration_mask)
+    start_time = pf.measurement_time[profiles, 1] - pf.measurement_time[0, 1]
+    integration_time = round(pf.integration_time.total_seconds())
+
+    # Write the profiles part by part, reading the raw signal of each part only when it's needed
+    if stream_profiles is None or "raw_signal" in vars(pf):
+        parts = [(0, pf)]
+    else:
+        parts = pf.split(stream_profiles)
+
+    offset = 0
+    for first, part in parts:
+        selected = profiles[(profiles >= first) & (profiles < first + part.profiles)]
+        written = slice(offset, offset + selected.shape[0])
+
+        write_raw_lidar_data(
+            raw_lidar_data,
+            part.raw_signal_swap,
+            selected - first,
+            pf.raw_signal_fill_value,
+            offset,
+        )
+        raw_data_start_time[written] = start_time[written, np.newaxis]
+        raw_data_stop_time[written] = start_time[written, np.newaxis] + integration_time
+        laser_shots[written] = pf.measurement_shots[selected]
+        offset += selected.shape[0]
+
     channel_id[:] = np.array(location.channel_id)
-    id_timescale[:] = np.zeros(np.size(pf.raw_signal[~pf.calibration_mask], axis=2))
+    id_timescale[:] = np.zeros(channels)
     laser_pointing_angle[:] = int(pf.zenith_angle.item(0))
-    laser_pointing_angle_of_profiles[:] = np.zeros(
-        np.size(pf.raw_signal[~pf.calibration_mask], axis=0)
-    )
-    laser_shots[:] = pf.measurement_shots[~pf.calibration_mask]
+    laser_pointing_angle_of_profiles[:] = np.zeros(profiles.shape[0])
     background_low[:] = np.array(location.background_low)
     background_high[:] = np.array(location.background_high)
     molecular_calc[:] = int(atmosphere)
@@ -193,6 +384,7 @@ def create_scc_calibration_netcdf(
     wavelength: Wavelength,
     pol_calib_range_min: int = 1200,
     pol_calib_range_max: int = 2500,
+    compression: Optional[Compression] = None,
 ) -> Tuple[str, Path]:
     """
     From a PollyXT netCDF file, create the corresponding calibration SCC file.
@@ -200,7 +392,8 @@ def create_scc_calibration_netcdf(
     - 02:31 to 02:41
     - 17:31 to 17:41
     - 21:31 to 21:41
-    Take care to create the `PollyXTFile` with these intervals.
+    Take care to create the `PollyXTFile` with these intervals. It only needs to contain the channels
+    returned by `calibration_channels()`.
 
     Parameters:
         pf: An opened PollyXT file
@@ -209,13 +402,17 @@ def create_scc_calibration_netcdf(
         wavelength: Calibration for 355nm or 532nm
         pol_calib_range_min: Calibration contant calculation, minimum height
         pol_calib_range_max: Calibration contant calculation, maximum height
+        compression: How to compress the variables. Default is `Compression()`.
 
     Returns:
         A tuple containing the measurement ID and the output path
     """
 
+    if compression is None:
+        compression = Compression()
+
     # Calculate measurement ID
-    measurement_id = pf.start_date.strftime(f"%Y%m%d{location.scc_code}%H")
+    measurement_id = get_measurement_id(location, pf.start_date, calibration=True)
 
     # Create SCC file
     # Output filename is always the measurement ID
@@ -246,50 +443,65 @@ def create_scc_calibration_netcdf(
 
     # Create Variables. (mandatory)
     raw_data_start_time = nc.createVariable(
-        "Raw_Data_Start_Time", "i4", dimensions=("time", "nb_of_time_scales"), zlib=True
+        "Raw_Data_Start_Time",
+        "i4",
+        dimensions=("time", "nb_of_time_scales"),
+        **compression.options(),
     )
     raw_data_stop_time = nc.createVariable(
-        "Raw_Data_Stop_Time", "i4", dimensions=("time", "nb_of_time_scales"), zlib=True
+        "Raw_Data_Stop_Time",
+        "i4",
+        dimensions=("time", "nb_of_time_scales"),
+        **compression.options(),
     )
     raw_lidar_data = nc.createVariable(
-        "Raw_Lidar_Data", "f8", dimensions=("time", "channels", "points"), zlib=True
+        "Raw_Lidar_Data",
+        "f8",
+        dimensions=("time", "channels", "points"),
+        chunksizes=compression.raw_lidar_data_chunks(nc),
+        **compression.options(),
     )
     channel_id = nc.createVariable(
-        "channel_ID", "i4", dimensions=("channels"), zlib=True
+        "channel_ID", "i4", dimensions=("channels"), **compression.options()
     )
     id_timescale = nc.createVariable(
-        "id_timescale", "i4", dimensions=("channels"), zlib=True
+        "id_timescale", "i4", dimensions=("channels"), **compression.options()
     )
     laser_pointing_angle = nc.createVariable(
-        "Laser_Pointing_Angle", "f8", dimensions=("scan_angles"), zlib=True
+        "Laser_Pointing_Angle",
+        "f8",
+        dimensions=("scan_angles"),
+        **compression.options(),
     )
     laser_pointing_angle_of_profiles = nc.createVariable(
         "Laser_Pointing_Angle_of_Profiles",
         "i4",
         dimensions=("time", "nb_of_time_scales"),
-        zlib=True,
+        **compression.options(),
     )
     laser_shots = nc.createVariable(
-        "Laser_Shots", "i4", dimensions=("time", "channels"), zlib=True
+        "Laser_Shots", "i4", dimensions=("time", "channels"), **compression.options()
     )
     background_low = nc.createVariable(
-        "Background_Low", "f8", dimensions=("channels"), zlib=True
+        "Background_Low", "f8", dimensions=("channels"), **compression.options()
     )
     background_high = nc.createVariable(
-        "Background_High", "f8", dimensions=("channels"), zlib=True
+        "Background_High", "f8", dimensions=("channels"), **compression.options()
+    )
+    molecular_calc = nc.createVariable(
+        "Molecular_Calc", "i4", dimensions=(), **compression.options()
     )
-    molecular_calc = nc.createVariable("Molecular_Calc", "i4", dimensions=(), zlib=True)
     pol_calib_range_min_var = nc.createVariable(
-        "Pol_Calib_Range_Min", "f8", dimensions=("channels"), zlib=True
+        "Pol_Calib_Range_Min", "f8", dimensions=("channels"), **compression.options()
     )
     pol_calib_range_max_var = nc.createVariable(
-        "Pol_Calib_Range_Max", "f8", dimensions=("channels"), zlib=True
+        "Pol_Calib_Range_Max", "f8", dimensions=("channels"), **compression.options()
     )
     pressure_at_lidar_station = nc.createVariable(
-        "Pressure_at_Lidar_Station", "f8", dimensions=(), zlib=True
+        "Pressure_at_Lidar_Station", "f8", dimensions=(), **compression.options()
     )
     temperature_at_lidar_station = nc.createVariable(
-        "Temperature_at_Lidar_Station", "f8", dimensions=(), zlib=True
+        "Temperature_at_Lidar_Station", "f8", dimensions=(), **compression.options()
     )
 
     # define measurement_cycles
@@ -304,7 +516,7 @@ def create_scc_calibration_netcdf(
     laser_shots[1, :] = np.array([600, 600, 600, 600])
     laser_shots[2, :] = np.array([600, 600, 600, 600])
     background_low[:] = np.array([0, 0, 0, 0])
-    background_high[:] = np.array([249, 249, 249, 249])
+    background_high[:] = np.full(4, CALIBRATION_BACKGROUND_HIGH)
     molecular_calc[:] = 0
     pol_calib_range_min_var[:] = np.repeat(pol_calib_range_min, 4)
     pol_calib_range_max_var[:] = np.repeat(pol_calib_range_max, 4)
@@ -331,6 +543,10 @@ def create_scc_calibration_netcdf(
     else:
         raise ValueError(f"Unknown wavelength {wavelength}")
 
+    # Position of the channels in the PollyXT file, which might not contain all channels
+    total_channel = pf.channel_index(total_channel)
+    cross_channel = pf.channel_index(cross_channel)
+
     # Copy calibration cycles
     for meas_cycle in range(0, 3, 1):
         laser_shots[meas_cycle, :] = np.array([600, 600, 600, 600])
@@ -338,18 +554,22 @@ def create_scc_calibration_netcdf(
         raw_data_start_time[meas_cycle, 0] = start_first_measurement + meas_cycle
         raw_data_stop_time[meas_cycle, 0] = stop_first_measurement + meas_cycle
 
-        raw_lidar_data[meas_cycle, 0, :] = pf.raw_signal_swap[
-            start_first_measurement + meas_cycle, cross_channel, :
-        ]
-        raw_lidar_data[meas_cycle, 1, :] = pf.raw_signal_swap[
-            start_first_measurement + meas_cycle, total_channel, :
-        ]
-        raw_lidar_data[meas_cycle, 2, :] = pf.raw_signal_swap[
-            stop_first_measurement + meas_cycle, cross_channel, :
-        ]
-        raw_lidar_data[meas_cycle, 3, :] = pf.raw_signal_swap[
-            stop_first_measurement + meas_cycle, total_channel, :
-        ]
+        raw_lidar_data[meas_cycle, 0, :] = raw_signal_as_float(
+            pf.raw_signal_swap[start_first_measurement + meas_cycle, cross_channel, :],
+            pf.raw_signal_fill_value,
+        )
+        raw_lidar_data[meas_cycle, 1, :] = raw_signal_as_float(
+            pf.raw_signal_swap[start_first_measurement + meas_cycle, total_channel, :],
+            pf.raw_signal_fill_value,
+        )
+        raw_lidar_data[meas_cycle, 2, :] = raw_signal_as_float(
+            pf.raw_signal_swap[stop_first_measurement + meas_cycle, cross_channel, :],
+            pf.raw_signal_fill_value,
+        )
+        raw_lidar_data[meas_cycle, 3, :] = raw_signal_as_float(
+            pf.raw_signal_swap[stop_first_measurement + meas_cycle, total_channel, :],
+            pf.raw_signal_fill_value,
+        )
 
     # Close the netCDF file.
     nc.close()
@@ -357,6 +577,180 @@ def create_scc_calibration_netcdf(
     return measurement_id, output_filename
 
 
+def get_measurement_id(
+    location: Location, start: datetime, calibration: bool = False
+) -> str:
+    """
+    Returns the measurement ID of an SCC file, which is also its filename. It only depends on the
+    time of the first profile, so intervals that start at the same minute (or, for calibration
+    files, hour) write the same file.
+
+    Parameters:
+        location: Where the measurement took place
+        start: Time of the first profile
+        calibration: Set to True for calibration files, whose ID doesn't contain the minutes
+    """
+
+    if calibration:
+        return start.strftime(f"%Y%m%d{location.scc_code}%H")
+    return start.strftime(f"%Y%m%d{location.scc_code}%H%M")
+
+
+def drop_superseded(tasks: Iterable[Tuple[str, ReadTask]]) -> Iterator[ReadTask]:
+    """
+    Given tasks in time order together with the measurement ID they will write, drops tasks that
+    write the same file as the next one. The last task would overwrite them anyway, but when tasks
+    are converted in parallel, the order of the writes (and which file survives) is random.
+    """
+
+    pending = None
+    for measurement_id, task in tasks:
+        if pending is not None and pending[0] != measurement_id:
+            yield pending[1]
+        pending = (measurement_id, task)
+    if pending is not None:
+        yield pending[1]
+
+
+def calibration_channels(location: Location) -> List[int]:
+    """
+    Returns the raw file channels used by the calibration files of a location, i.e. the total
+    and cross channels of both wavelengths.
+    """
+
+    return sorted(
+        {
+            location.total_channel_355_nm,
+            location.cross_channel_355_nm,
+            location.total_channel_532_nm,
+            location.cross_channel_532_nm,
+        }
+    )
+
+
+def conversion_tasks(
+    repo: pollyxt.PollyXTRepository,
+    location: Location,
+    measurement_start: datetime,
+    measurement_end: datetime,
+    interval: timedelta,
+    should_round=False,
+    calibration=True,
+    stream_profiles: Optional[int] = None,
+) -> Iterator[ReadTask]:
+    """
+    Splits the given time range into intervals and returns what has to be read for each output
+    file. Empty intervals are skipped. Only the repository index is used, no raw file is opened.
+
+    If two consecutive intervals would write the same file (e.g. when the only profile of an
+    interval is the first profile of the next one, after a gap), only the last one is kept. See
+    `drop_superseded()`.
+
+    Parameters:
+        repo: The PollyXT repository
+        location: Where the measurement took place, for the channel and range bin selection
+        measurement_start: Start of the first interval
+        measurement_end: No interval starts after this time
+        interval: Length of each interval
+        should_round: If true, the interval starts will be rounded down. For example, from 01:02 to 01:00.
+        calibration: Set to False to skip the calibration periods
+        stream_profiles: Optionally, read the raw signal of each output file in parts of this many
+            profiles while writing (see `create_scc_netcdf()`)
+    """
+
+    yield from drop_superseded(
+        _measurement_tasks(
+            repo,
+            location,
+            measurement_start,
+            measurement_end,
+            interval,
+            should_round,
+            stream_profiles,
+        )
+    )
+
+    # Check for any valid calibration intervals
+    if calibration:
+        yield from drop_superseded(
+            (
+                get_measurement_id(location, start, calibration=True),
+                ReadTask(
+                    start=start,
+                    end=end,
+                    slices=repo.find_slices(start, end),
+                    channels=calibration_channels(location),
+                    max_points=location.max_points,
+                    calibration=True,
+                ),
+            )
+            for start, end in repo.get_calibration_periods()
+            if start > measurement_start and end < measurement_end
+        )
+
+
+def _measurement_tasks(
+    repo: pollyxt.PollyXTRepository,
+    location: Location,
+    measurement_start: datetime,
+    measurement_end: datetime,
+    interval: timedelta,
+    should_round: bool,
+    stream_profiles: Optional[int],
+) -> Iterator[Tuple[str, ReadTask]]:
+    """
+    Returns the measurement ID and task of each non-empty interval. See `conversion_tasks()`.
+    """
+
+    # Empty intervals can only be before, after or inside a gap that's longer than an interval
+    first_measurement, last_measurement = repo.get_time_period()
+    gap_ends = [after for _, after in repo.get_gaps(interval)]
+
+    interval_start = measurement_start
+    while interval_start < measurement_end:
+        # If the option is set, round down hours
+        if should_round:
+            interval_start = interval_start.replace(microsecond=0, second=0, minute=0)
+
+        # Interval end
+        interval_end = interval_start + interval
+
+        # Intervals extend one integration time past their end, so the next profile is included
+        slices = repo.find_slices(interval_start, interval_end + repo.integration_time)
+        if len(slices) == 0:
+            # Skip any following intervals that are also empty (i.e. a gap in the measurements)
+            # by jumping to the interval that contains the next measurement
+            if interval_end >= last_measurement:
+                break
+            if interval_end < first_measurement:
+                next_measurement = first_measurement
+            else:
+                next_measurement = gap_ends[bisect.bisect_right(gap_ends, interval_end)]
+
+            # Intervals extend one integration time past their end, see above
+            gap = next_measurement - interval_end - repo.integration_time
+            skip = -(-gap // interval) - 1  # ceil(gap / interval) - 1
+            interval_start = interval_end + max(skip, 0) * interval
+            continue
+
+        first_profile = repo.get_first_timestamp(interval_start)
+        yield get_measurement_id(location, first_profile), ReadTask(
+            start=interval_start,
+            end=interval_end,
+            slices=slices,
+            channels=location.channels,
+            max_points=location.max_points,
+            stream_profiles=stream_profiles,
+        )
+
+        # Set start of next interval to the end of this one
+        interval_start = interval_end
+
+
+ConversionResult = Tuple[str, Path, datetime, datetime]
+"""Measurement ID, path, start and end of a created SCC file"""
+
+
 def convert_pollyxt_file(
     repo: pollyxt.PollyXTRepository,
     output_path: Path,
@@ -367,6 +761,12 @@ def convert_pollyxt_file(
     calibration=True,
     start_time=None,
     end_time=None,
+    prefetch: int = 0,
+    timings: Optional[Timings] = None,
+    jobs: int = 1,
+    compression: Optional[Compression] = None,
+    stream_profiles: Optional[int] = None,
+    manifest: Optional[Manifest] = None,
 ):
     """
     Converts a pollyXT repository into a collection of SCC files. The input files will be split/merged into intervals
@@ -389,6 +789,17 @@ def convert_pollyxt_file(
         start_hour: Optionally, set when the first file should start. The intervals will start from here. (HH:MM or YYYY-MM-DD_HH:MM format, string)
         end_hour: Optionally, also set the end time. Must be used with `start_hour`. If this is set, only one output file
                   is generated, for your target interval (HH:MM or YYYY-MM-DD_HH:MM format, string).
+        prefetch: How many output files to read ahead, in a background process, while writing. Use 0 to read
+                  each file only when it's needed (see `Prefetcher`).
+        timings: Optionally, add the time spent reading and writing here
+        jobs: How many output files to convert at the same time, each in its own process (see
+              `convert_in_parallel()`). When larger than 1, `prefetch` is ignored.
+        compression: How to compress the SCC files. Default is `Compression()`.
+        stream_profiles: Optionally, read the raw signal of each output file in parts of this many
+            profiles while writing it, instead of all at once (see `create_scc_netcdf()`). This
+            limits the memory used for long intervals.
+        manifest: Optionally, skip the output files that this manifest lists as current and record
+            the created ones in it (see `manifest.Manifest`). The skipped files are not returned.
     """
 
     # Open input netCDF
@@ -415,45 +826,199 @@ def convert_pollyxt_file(
         measurement_end = end_time
         interval = timedelta(seconds=(end_time - start_time).total_seconds())
 
-    # Create output files
-    interval_start = measurement_start
-    while interval_start < measurement_end:
-        # If the option is set, round down hours
-        if should_round:
-            interval_start = interval_start.replace(microsecond=0, second=0, minute=0)
+    tasks = conversion_tasks(
+        repo,
+        location,
+        measurement_start,
+        measurement_end,
+        interval,
+        should_round=should_round,
+        calibration=calibration,
+        stream_profiles=stream_profiles,
+    )
+    if timings is None:
+        timings = Timings()
+
+    # Skip the tasks whose files are already up to date
+    options = conversion_options(location, atmosphere, compression)
+    if manifest is not None:
+        tasks = manifest.skip_current(tasks, options)
+
+    if jobs > 1:
+        converted = convert_in_parallel(
+            tasks,
+            jobs,
+            repo.pool,
+            output_path,
+            location,
+            atmosphere,
+            timings,
+            compression,
+        )
+    else:
+        converted = _convert_serially(
+            tasks,
+            repo.pool,
+            output_path,
+            location,
+            atmosphere,
+            prefetch,
+            timings,
+            compression,
+        )
+
+    try:
+        for task, results in converted:
+            if manifest is not None:
+                manifest.record(task, options, results)
+            yield from results
+    finally:
+        converted.close()
+        if manifest is not None:
+            manifest.save()
 
-        # Interval end
-        interval_end = interval_start + interval
 
-        # Open netCDF file and convert to SCC
-        try:
-            pf = repo.get_pollyxt_file(
-                interval_start, interval_end + timedelta(seconds=30)
+def _convert_serially(
+    tasks: Iterable[ReadTask],
+    pool: Optional[DatasetPool],
+    output_path: Path,
+    location: Location,
+    atmosphere: Atmosphere,
+    prefetch: int,
+    timings: Timings,
+    compression: Optional[Compression],
+) -> Iterator[Tuple[ReadTask, List[ConversionResult]]]:
+    with Prefetcher(tasks, prefetch, pool, timings) as prefetcher:
+        for task, pf in prefetcher:
+            start = time.perf_counter()
+            results = convert_task(
+                task, pf, output_path, location, atmosphere, compression
             )
-            id, path = create_scc_netcdf(pf, output_path, location, atmosphere)
+            timings.write += time.perf_counter() - start
+            yield task, results
 
-            yield id, path, pf.start_date, pf.end_date
-        except NoMeasurementsInTimePeriod as ex:
-            # Go to next loop
-            interval_start = interval_end
-            continue
 
-        # Set start of next interval to the end of this one
-        interval_start = interval_end
+def conversion_options(
+    location: Location, atmosphere: Atmosphere, compression: Optional[Compression]
+) -> Dict[str, object]:
+    """
+    Returns everything besides the raw data that affects the SCC files, for the manifest (see
+    `manifest.Manifest`)
+    """
 
-    # Generate calibration files
-    if calibration:
-        # Check for any valid calibration intervals
-        for start, end in repo.get_calibration_periods():
-            if start > measurement_start and end < measurement_end:
-                pf = repo.get_pollyxt_file(start, end)
-
-                id, path = create_scc_calibration_netcdf(
-                    pf, output_path, location, wavelength=Wavelength.NM_532
-                )
-                yield id, path, start, end
-
-                id, path = create_scc_calibration_netcdf(
-                    pf, output_path, location, wavelength=Wavelength.NM_355
-                )
-                yield id, path, start, end
+    return {
+        "location": location._asdict(),
+        "atmosphere": int(atmosphere),
+        "compression": (compression or Compression())._asdict(),
+    }
+
+
+def convert_task(
+    task: ReadTask,
+    pf: pollyxt.PollyXTFile,
+    output_path: Path,
+    location: Location,
+    atmosphere: Atmosphere,
+    compression: Optional[Compression] = None,
+) -> List[ConversionResult]:
+    """
+    Creates the SCC files of one task: either one measurement file or, for calibration tasks, one
+    calibration file for each wavelength.
+
+    Parameters:
+        task: What to convert
+        pf: The data of the task (see `read_task()`)
+        output_path: Directory to write the SCC files
+        location: Geographical information, where the measurement took place
+        atmosphere: Which atmosphere to use on SCC
+        compression: How to compress the SCC files. Default is `Compression()`.
+    """
+
+    if not task.calibration:
+        id, path = create_scc_netcdf(
+            pf, output_path, location, atmosphere, compression, task.stream_profiles
+        )
+        return [(id, path, pf.start_date, pf.end_date)]
+
+    results = []
+    for wavelength in [Wavelength.NM_532, Wavelength.NM_355]:
+        id, path = create_scc_calibration_netcdf(
+            pf, output_path, location, wavelength=wavelength, compression=compression
+        )
+        results.append((id, path, task.start, task.end))
+    return results
+
+
+def _convert_in_worker(
+    task: ReadTask,
+    output_path: Path,
+    location: Location,
+    atmosphere: Atmosphere,
+    compression: Optional[Compression],
+) -> Tuple[List[ConversionResult], float, float]:
+    start = time.perf_counter()
+    pf = read_task(task, worker_pool())
+    read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = convert_task(task, pf, output_path, location, atmosphere, compression)
+    return results, read, time.perf_counter() - start
+
+
+def convert_in_parallel(
+    tasks: Iterable[ReadTask],
+    jobs: int,
+    pool: Optional[DatasetPool],
+    output_path: Path,
+    location: Location,
+    atmosphere: Atmosphere,
+    timings: Optional[Timings] = None,
+    compression: Optional[Compression] = None,
+) -> Iterator[Tuple[ReadTask, List[ConversionResult]]]:
+    """
+    Converts tasks in a pool of processes. Each process reads the raw data of a task and writes its
+    SCC files, so both reading and compression happen in parallel. Each task is returned with its
+    files, in the order of the tasks.
+
+    Parameters:
+        tasks: What to convert (see `conversion_tasks()`). All tasks are planned up front.
+        jobs: How many processes to use
+        pool: The open files of the main process, whose settings the processes copy
+        output_path: Directory to write the SCC files
+        location: Geographical information, where the measurement took place
+        atmosphere: Which atmosphere to use on SCC
+        timings: Optionally, add the time spent reading and writing (by all processes) here
+        compression: How to compress the SCC files. Default is `Compression()`.
+    """
+
+    if timings is None:
+        timings = Timings()
+
+    executor = start_workers(jobs, pool)
+    queue: Deque[Tuple[ReadTask, Future]] = deque()
+    try:
+        queue.extend(
+            (
+                task,
+                executor.submit(
+                    _convert_in_worker,
+                    task,
+                    output_path,
+                    location,
+                    atmosphere,
+                    compression,
+                ),
+            )
+            for task in list(tasks)
+        )
+        while len(queue) > 0:
+            task, future = queue.popleft()
+            start = time.perf_counter()
+            results, read, write = future.result()
+            timings.wait += time.perf_counter() - start
+            timings.read += read
+            timings.write += write
+            yield task, results
+    finally:
+        # Don't convert tasks that were never handed over
+        utils.shutdown_pool(executor, (future for _, future in queue))
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from pollyxt_pipelines.polly_to_scc import pollyxt
+from pollyxt_pipelines.polly_to_scc.backends import get_backend
+from pollyxt_pipelines.polly_to_scc.scc_netcdf import raw_signal_as_float
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+
+
+def test_h5py_backend(tmp_path):
+    """
+    Tests that the h5py backend reads the same data as netCDF4
+    """
+
+    pytest.importorskip("h5py")
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 20, calibration=[(2, 5)])
+    create_raw_file(tmp_path / "b.nc", start + timedelta(minutes=10), 20)
+
+    repos = [
+        pollyxt.PollyXTRepository(tmp_path, use_cache=False, backend=get_backend(name))
+        for name in ["netcdf4", "h5py"]
+    ]
+    assert np.array_equal(repos[0].timestamps, repos[1].timestamps)
+    assert list(repos[0].get_calibration_periods()) == list(
+        repos[1].get_calibration_periods()
+    )
+
+    end = start + timedelta(minutes=20)
+    files = [repo.get_pollyxt_file(start, end, channels=[1, 3]) for repo in repos]
+    for name in ["raw_signal", "measurement_shots", "measurement_time", "zenith_angle"]:
+        assert np.array_equal(getattr(files[0], name), getattr(files[1], name))
+
+    for repo in repos:
+        repo.close()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("hdf4")
+
+
+@pytest.mark.parametrize("name", ["netcdf4", "h5py"])
+def test_fill_values(tmp_path, name):
+    """
+    Tests that missing values are handled without masked arrays
+    """
+
+    if name == "h5py":
+        pytest.importorskip("h5py")
+
+    create_raw_file(tmp_path / "a.nc", datetime(2021, 1, 1), 10, calibration=[(2, 4)])
+    with Dataset(tmp_path / "a.nc", "a") as nc:
+        nc["raw_signal"][5, 3, 1] = np.ma.masked
+        nc["depol_cal_angle"][7] = np.ma.masked
+
+    backend = get_backend(name)
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False, backend=backend)
+    assert len(list(repo.get_calibration_periods())) == 1
+
+    pf = repo.get_pollyxt_file(*repo.get_time_period())
+    assert not np.ma.isMaskedArray(pf.raw_signal)
+    assert list(pf.calibration_mask) == [i in (2, 3) for i in range(10)]
+
+    data = raw_signal_as_float(pf.raw_signal, pf.raw_signal_fill_value)
+    assert np.isnan(data[5, 3, 1])
+    assert np.count_nonzero(np.isnan(data)) == 1
+
+
+def test_h5py_backend_classic_files(tmp_path):
+    """
+    Tests that files which are not HDF5 are also read as plain arrays by the h5py backend
+    """
+
+    pytest.importorskip("h5py")
+
+    with Dataset(tmp_path / "a.nc", "w", format="NETCDF3_CLASSIC") as nc:
+        nc.createDimension("time", 3)
+        variable = nc.createVariable("raw_signal", "i4", ("time",), fill_value=-1)
+        variable[:] = [10, 20, -1]
+
+    with get_backend("h5py").open(tmp_path / "a.nc") as nc:
+        data = nc["raw_signal"][:]
+    assert not np.ma.isMaskedArray(data)
+    assert list(data) == [10, 20, -1]
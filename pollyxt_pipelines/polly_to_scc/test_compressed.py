@@ -0,0 +1,56 @@
+import gzip
+import os
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+from pollyxt_pipelines.polly_to_scc import pollyxt
+from pollyxt_pipelines.polly_to_scc.compressed import ScratchCache
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+
+
+def test_repository_compressed_files(tmp_path):
+    """
+    Tests that compressed files are discovered and read like regular files
+    """
+
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    create_raw_file(tmp_path / "a.nc", datetime(2021, 1, 1), 10)
+    create_raw_file(tmp_path / "b.nc", datetime(2021, 1, 1, 1), 10)
+    with gzip.open(raw / "a.nc.gz", "wb") as file:
+        file.write((tmp_path / "a.nc").read_bytes())
+    with zipfile.ZipFile(raw / "b.nc.zip", "w") as archive:
+        archive.write(tmp_path / "b.nc", "b.nc")
+
+    scratch = ScratchCache(tmp_path / "scratch")
+    repo = pollyxt.PollyXTRepository(raw, use_cache=False, scratch=scratch)
+    assert repo.files == [raw / "a.nc.gz", raw / "b.nc.zip"]
+
+    start, end = repo.get_time_period()
+    pf = repo.get_pollyxt_file(start, end)
+    original = pollyxt.PollyXTFile(tmp_path / "a.nc")
+    assert np.array_equal(pf.raw_signal[:10], original.raw_signal)
+    repo.close()
+
+
+def test_scratch_cache_eviction(tmp_path):
+    """
+    Tests that the least recently used files are deleted when the cache is full
+    """
+
+    for name in ["a", "b", "c"]:
+        with gzip.open(tmp_path / f"{name}.nc.gz", "wb") as file:
+            file.write(bytes(1000))
+
+    scratch = ScratchCache(tmp_path / "scratch", max_bytes=2500)
+    a = scratch.get(tmp_path / "a.nc.gz")
+    b = scratch.get(tmp_path / "b.nc.gz")
+    os.utime(b, ns=(0, 0))  # Make `b` the least recently used file
+    c = scratch.get(tmp_path / "c.nc.gz")
+
+    assert a.is_file()
+    assert not b.exists()
+    assert c.is_file()
+    assert c.stat().st_size == 1000
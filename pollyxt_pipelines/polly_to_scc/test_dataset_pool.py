@@ -0,0 +1,29 @@
+from netCDF4 import Dataset
+
+from pollyxt_pipelines.polly_to_scc.dataset_pool import DatasetPool
+
+
+def test_dataset_pool_eviction(tmp_path):
+    """
+    Tests that handles are reused and the least recently used file is closed when the pool is full
+    """
+
+    paths = [tmp_path / f"{i}.nc" for i in range(3)]
+    for path in paths:
+        with Dataset(path, "w") as nc:
+            nc.createDimension("time", 1)
+
+    pool = DatasetPool(capacity=2)
+    first = pool.get(paths[0])
+    second = pool.get(paths[1])
+    assert pool.get(paths[0]) is first
+
+    # File 1 is now the least recently used and should be closed
+    pool.get(paths[2])
+    assert list(pool.datasets.keys()) == [paths[0], paths[2]]
+    assert not second.isopen()
+    assert first.isopen()
+
+    pool.close()
+    assert not first.isopen()
+    assert len(pool.datasets) == 0
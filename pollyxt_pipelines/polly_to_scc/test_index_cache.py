@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from pollyxt_pipelines.polly_to_scc.index_cache import IndexCache
+
+
+def test_index_cache_roundtrip(tmp_path):
+    """
+    Tests that entries survive a save/load cycle
+    """
+
+    raw_file = tmp_path / "raw.nc"
+    raw_file.write_bytes(b"123")
+    measurement_time = np.array([[20210101, 0], [20210101, 30]])
+    depol_cal_angle = np.array([0.0, 45.0])
+
+    cache = IndexCache(tmp_path)
+    cache.put(raw_file, measurement_time, depol_cal_angle)
+    cache.save()
+
+    entry = IndexCache(tmp_path).get(raw_file)
+    assert entry is not None
+    assert np.array_equal(entry.measurement_time, measurement_time)
+    assert np.array_equal(entry.depol_cal_angle, depol_cal_angle)
+
+
+def test_index_cache_invalidation(tmp_path):
+    """
+    Tests that modified files are not returned from the cache
+    """
+
+    raw_file = tmp_path / "raw.nc"
+    raw_file.write_bytes(b"123")
+
+    cache = IndexCache(tmp_path)
+    cache.put(raw_file, np.array([[20210101, 0]]), np.array([0.0]))
+    cache.save()
+
+    # Change the file size
+    raw_file.write_bytes(b"123456")
+    assert IndexCache(tmp_path).get(raw_file) is None
+
+    # Change only the modification time
+    cache = IndexCache(tmp_path)
+    cache.put(raw_file, np.array([[20210101, 0]]), np.array([0.0]))
+    stat = raw_file.stat()
+    os.utime(raw_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(raw_file) is None
+
+
+def test_index_cache_corrupted(tmp_path):
+    """
+    Tests that a truncated cache file is treated as an empty cache and replaced on save
+    """
+
+    raw_file = tmp_path / "raw.nc"
+    raw_file.write_bytes(b"123")
+
+    cache = IndexCache(tmp_path)
+    cache.put(raw_file, np.array([[20210101, 0]]), np.array([0.0]))
+    cache.save()
+
+    data = cache.path.read_bytes()
+    cache.path.write_bytes(data[: len(data) // 2])
+
+    cache = IndexCache(tmp_path)
+    assert cache.get(raw_file) is None
+    cache.put(raw_file, np.array([[20210101, 0]]), np.array([0.0]))
+    cache.save()
+    assert IndexCache(tmp_path).get(raw_file) is not None
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta
+
+from pollyxt_pipelines.locations import LOCATIONS
+from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+from pollyxt_pipelines.polly_to_scc.manifest import MANIFEST_FILENAME, Manifest
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+
+
+def convert(input_path, output_path, compression=None):
+    """Converts the raw files using the manifest and returns it, with the created files"""
+
+    manifest = Manifest(output_path)
+    with pollyxt.PollyXTRepository(input_path, use_cache=False) as repo:
+        created = list(
+            scc_netcdf.convert_pollyxt_file(
+                repo,
+                output_path,
+                LOCATIONS["Antikythera"],
+                timedelta(minutes=30),
+                scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+                compression=compression,
+                manifest=manifest,
+            )
+        )
+    return manifest, created
+
+
+def test_manifest_skips_current_files(tmp_path):
+    """
+    Tests that only files whose inputs changed are converted again
+    """
+
+    input_path = tmp_path / "raw"
+    output_path = tmp_path / "scc"
+    input_path.mkdir()
+    output_path.mkdir()
+    start = datetime(2021, 1, 1)
+    create_raw_file(input_path / "a.nc", start, 120, channels=12)
+    create_raw_file(input_path / "b.nc", start + timedelta(hours=1), 120, channels=12)
+
+    manifest, created = convert(input_path, output_path)
+    assert len(created) == 4
+    assert manifest.skipped == 0
+    assert (output_path / MANIFEST_FILENAME).is_file()
+
+    # Nothing changed
+    manifest, created = convert(input_path, output_path)
+    assert created == []
+    assert manifest.skipped == 4
+
+    # A modified raw file only affects the intervals that include it (intervals extend 30 seconds
+    # into the next one)
+    stat = (input_path / "b.nc").stat()
+    os.utime(input_path / "b.nc", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    manifest, created = convert(input_path, output_path)
+    assert [x[2] for x in created] == [
+        start + timedelta(minutes=30),
+        start + timedelta(minutes=60),
+        start + timedelta(minutes=90),
+    ]
+    assert manifest.skipped == 1
+
+    # Deleted output files are created again
+    created[0][1].unlink()
+    manifest, created = convert(input_path, output_path)
+    assert len(created) == 1
+
+    # Different options invalidate everything
+    manifest, created = convert(
+        input_path, output_path, scc_netcdf.Compression.from_mode("fast")
+    )
+    assert len(created) == 4
+
+
+def test_manifest_drops_deleted_files(tmp_path):
+    """
+    Tests that entries whose files were deleted are removed from the manifest when it's saved
+    """
+
+    input_path = tmp_path / "raw"
+    output_path = tmp_path / "scc"
+    input_path.mkdir()
+    output_path.mkdir()
+    create_raw_file(input_path / "a.nc", datetime(2021, 1, 1), 120, channels=12)
+
+    manifest, created = convert(input_path, output_path)
+    assert len(manifest.entries) == 2
+
+    # E.g. older files are rotated away
+    created[0][1].unlink()
+    manifest = Manifest(output_path)
+    manifest.save()
+
+    manifest = Manifest(output_path)
+    assert len(manifest.entries) == 1
+    [entry] = manifest.entries.values()
+    assert entry["outputs"][0][0] == created[1][1].name
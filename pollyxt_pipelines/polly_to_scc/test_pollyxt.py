@@ -1,8 +1,54 @@
+import os
+from datetime import datetime, timedelta
+
 import numpy as np
+from netCDF4 import Dataset
 
 from pollyxt_pipelines.polly_to_scc import pollyxt
 
 
+def create_raw_file(
+    path, start, profiles, points=16, channels=4, calibration=(), integration_time=30
+):
+    """
+    Creates a small PollyXT-like netCDF file. Profiles are `integration_time` seconds apart,
+    `calibration` is a list of (start, end) index pairs where `depol_cal_angle` is set.
+    """
+
+    times = [start + timedelta(seconds=integration_time * i) for i in range(profiles)]
+    measurement_time = [
+        [int(t.strftime("%Y%m%d")), t.hour * 3600 + t.minute * 60 + t.second]
+        for t in times
+    ]
+    raw_signal = np.arange(profiles * points * channels).reshape(
+        profiles, points, channels
+    )
+    depol_cal_angle = np.zeros(profiles)
+    for cal_start, cal_end in calibration:
+        depol_cal_angle[cal_start:cal_end] = 45.0
+
+    with Dataset(path, "w") as nc:
+        nc.createDimension("time", None)
+        nc.createDimension("height", points)
+        nc.createDimension("channel", channels)
+        nc.createDimension("date_time", 2)
+        nc.createDimension("coordinates", 2)
+        nc.createDimension("angle", 1)
+
+        variable = nc.createVariable("measurement_time", "i4", ("time", "date_time"))
+        variable[:] = measurement_time
+        variable = nc.createVariable("raw_signal", "i4", ("time", "height", "channel"))
+        variable[:] = raw_signal
+        variable = nc.createVariable("measurement_shots", "i4", ("time", "channel"))
+        variable[:] = np.full((profiles, channels), 600)
+        variable = nc.createVariable("zenithangle", "f4", ("angle",))
+        variable[:] = 5.0
+        variable = nc.createVariable("location_coordinates", "f4", ("coordinates",))
+        variable[:] = [23.3, 35.8]
+        variable = nc.createVariable("depol_cal_angle", "f4", ("time",))
+        variable[:] = depol_cal_angle
+
+
 def test_make_nan_during_calibration():
     """
     Tests that calibration times are actually set to NaN
@@ -44,3 +90,397 @@ def test_make_nan_during_calibration():
         (raw_signal == correct_raw_signal)
         | (np.isnan(raw_signal) == np.isnan(correct_raw_signal))
     )
+
+
+def test_polly_dates_to_datetime64():
+    """
+    Tests that the vectorized date conversion matches `polly_date_to_datetime` and flags bad dates
+    """
+
+    measurement_time = np.array(
+        [
+            [20200228, 0],
+            [20200229, 86370],
+            [20210229, 30],  # Not a leap year
+            [20211301, 30],  # Bad month
+            [0, 0],
+        ]
+    )
+
+    timestamps, valid = pollyxt.polly_dates_to_datetime64(measurement_time)
+
+    assert list(valid) == [True, True, False, False, False]
+    for i in range(2):
+        expected = pollyxt.polly_date_to_datetime(measurement_time[i])
+        assert timestamps[i] == np.datetime64(expected)
+    assert np.all(np.isnat(timestamps[2:]))
+
+
+def test_repository_find_slices(tmp_path):
+    """
+    Tests that time ranges are resolved to the correct file slices, even across files
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 120)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(hours=1), 120)
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+
+    assert repo.find_slices(start, start + timedelta(minutes=10)) == [
+        (tmp_path / "a.nc", 0, 20)
+    ]
+    assert repo.find_slices(
+        start + timedelta(minutes=50), start + timedelta(minutes=70)
+    ) == [(tmp_path / "a.nc", 100, 119), (tmp_path / "b.nc", 0, 20)]
+    assert (
+        repo.find_slices(start - timedelta(hours=1), start - timedelta(seconds=1)) == []
+    )
+
+    pf = repo.get_pollyxt_file(
+        start + timedelta(minutes=50), start + timedelta(minutes=70)
+    )
+    assert pf.raw_signal.shape[0] == 41
+
+
+def test_pollyxt_file_lazy_loading(tmp_path):
+    """
+    Tests that variables are only read when accessed
+    """
+
+    create_raw_file(tmp_path / "a.nc", datetime(2021, 1, 1), 10, calibration=[(2, 4)])
+
+    pf = pollyxt.PollyXTFile(tmp_path / "a.nc", start=1, end=5)
+    assert pf.start_date == datetime(2021, 1, 1, 0, 0, 30)
+    assert list(pf.calibration_mask) == [False, True, True, False, False]
+    assert "raw_signal" not in vars(pf)
+
+    assert pf.raw_signal.shape == (5, 16, 4)
+    assert pf.raw_signal_swap.shape == (5, 4, 16)
+
+
+def test_find_true_runs():
+    """
+    Tests run detection, including runs touching the array edges
+    """
+
+    mask = np.array([True, True, False, False, True, False, True, True, True])
+    starts, ends = pollyxt.find_true_runs(mask)
+    assert list(starts) == [0, 4, 6]
+    assert list(ends) == [1, 4, 8]
+
+    starts, ends = pollyxt.find_true_runs(np.zeros(5, dtype=bool))
+    assert len(starts) == 0 and len(ends) == 0
+
+
+def test_repository_calibration_periods(tmp_path):
+    """
+    Tests that calibration periods are found, even when they cross file boundaries
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 120, calibration=[(10, 20), (115, 120)])
+    create_raw_file(
+        tmp_path / "b.nc", start + timedelta(hours=1), 120, calibration=[(0, 5)]
+    )
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+
+    assert list(repo.get_calibration_periods()) == [
+        (start + timedelta(seconds=300), start + timedelta(seconds=570)),
+        (start + timedelta(seconds=3450), start + timedelta(seconds=3720)),
+    ]
+
+
+def test_find_time_indices_irregular():
+    """
+    Tests that indices are correct with a 60 second cadence and a gap in the measurements
+    """
+
+    seconds = [0, 60, 120, 180, 3600, 3660, 3720]
+    measurement_time = np.array([[20210101, x] for x in seconds])
+
+    start = datetime(2021, 1, 1, 0, 1)
+    end = datetime(2021, 1, 1, 1, 1)
+    assert pollyxt.find_time_indices(measurement_time, start, end) == (1, 5)
+
+    # Start inside the gap
+    start = datetime(2021, 1, 1, 0, 30)
+    assert pollyxt.find_time_indices(measurement_time, start, end) == (4, 5)
+
+
+def test_repository_gaps(tmp_path):
+    """
+    Tests gap detection
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 120)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(hours=5), 120)
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+
+    last_before_gap = start + timedelta(seconds=119 * 30)
+    first_after_gap = start + timedelta(hours=5)
+    assert repo.get_gaps(timedelta(minutes=5)) == [(last_before_gap, first_after_gap)]
+    assert repo.get_gaps(timedelta(hours=5)) == []
+
+
+def test_pollyxt_file_channel_subset(tmp_path, monkeypatch):
+    """
+    Tests that only the requested channels are read, across read blocks and files
+    """
+
+    monkeypatch.setattr(pollyxt, "READ_BLOCK_PROFILES", 3)
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 10, channels=6)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(seconds=300), 10, channels=6)
+
+    slices = [(tmp_path / "a.nc", 2, 9), (tmp_path / "b.nc", 0, 4)]
+    full = pollyxt.PollyXTFile.from_slices(slices)
+    subset = pollyxt.PollyXTFile.from_slices(slices, channels=[5, 1, 2])
+
+    assert subset.channels == [1, 2, 5]
+    assert subset.channel_index(5) == 2
+    assert np.array_equal(subset.raw_signal, full.raw_signal[:, :, [1, 2, 5]])
+    assert np.array_equal(
+        subset.measurement_shots, full.measurement_shots[:, [1, 2, 5]]
+    )
+
+
+def test_pollyxt_file_max_points(tmp_path):
+    """
+    Tests that raw_signal is trimmed to max_points, with and without a channel subset
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 10, points=16, channels=6)
+
+    full = pollyxt.PollyXTFile(tmp_path / "a.nc", 2, 7)
+    trimmed = pollyxt.PollyXTFile(tmp_path / "a.nc", 2, 7, max_points=5)
+    subset = pollyxt.PollyXTFile(tmp_path / "a.nc", 2, 7, channels=[1, 4], max_points=5)
+
+    assert trimmed.raw_signal.shape == (6, 5, 6)
+    assert np.array_equal(trimmed.raw_signal, full.raw_signal[:, :5, :])
+    assert np.array_equal(subset.raw_signal, full.raw_signal[:, :5, [1, 4]])
+    assert np.array_equal(trimmed.depol_cal_angle, full.depol_cal_angle)
+
+
+def test_repository_iter_chunks(tmp_path):
+    """
+    Tests that chunks respect the size limit and, together, match reading the whole period at once
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 10, calibration=[(3, 6)])
+    create_raw_file(tmp_path / "b.nc", start + timedelta(seconds=300), 10)
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    end = start + timedelta(seconds=570)
+    full = repo.get_pollyxt_file(start, end, channels=[0, 2])
+
+    # Each profile is 16 points * 2 channels * 4 bytes + 2 shots * 4 bytes + 8 + 1 bytes
+    max_bytes = 4 * (128 + 8 + 8 + 1)
+    chunks = list(repo.iter_chunks(start, end, max_bytes=max_bytes, channels=[0, 2]))
+
+    assert len(chunks) == 5
+    assert all(chunk.raw_signal.nbytes <= max_bytes for chunk in chunks)
+    assert np.array_equal(
+        np.concatenate([chunk.raw_signal for chunk in chunks]), full.raw_signal
+    )
+    assert np.array_equal(
+        np.concatenate([chunk.calibration_mask for chunk in chunks]),
+        full.calibration_mask,
+    )
+    timestamps = np.concatenate([chunk.timestamps for chunk in chunks])
+    assert timestamps[0].item() == start
+    assert timestamps[-1].item() == end
+    assert np.all(np.diff(timestamps) > np.timedelta64(0, "s"))
+
+
+def test_repository_compact_index(tmp_path):
+    """
+    Tests the index arrays and the packed calibration mask
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(seconds=300), 10)
+    create_raw_file(tmp_path / "a.nc", start, 10, calibration=[(3, 6)])
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+
+    assert repo.file_ids.dtype == np.int32
+    assert repo.file_indices.dtype == np.int32
+    assert repo.get_time_period() == (start, start + timedelta(seconds=570))
+
+    expected = np.zeros(20, dtype=bool)
+    expected[3:6] = True
+    assert np.array_equal(repo.get_calibration_mask(), expected)
+    assert np.array_equal(repo.get_calibration_mask(5, 13), expected[5:13])
+
+
+def test_repository_duplicates(tmp_path):
+    """
+    Tests that overlapping profiles are only kept from the preferred file
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 120)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(minutes=30), 100)
+    os.utime(tmp_path / "a.nc", ns=(0, 1_000_000_000))
+    os.utime(tmp_path / "b.nc", ns=(0, 2_000_000_000))
+    end = start + timedelta(hours=2)
+
+    # b.nc is newer
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    assert repo.timestamps.shape[0] == 160
+    assert repo.find_slices(start, end) == [
+        (tmp_path / "a.nc", 0, 59),
+        (tmp_path / "b.nc", 0, 99),
+    ]
+    assert repo.dropped == [
+        pollyxt.DroppedProfiles(
+            tmp_path / "a.nc",
+            60,
+            start + timedelta(minutes=30),
+            start + timedelta(minutes=59, seconds=30),
+        )
+    ]
+
+    # a.nc is larger
+    repo = pollyxt.PollyXTRepository(
+        tmp_path, use_cache=False, duplicates=pollyxt.DuplicatePolicy.LARGEST
+    )
+    assert repo.find_slices(start, end) == [
+        (tmp_path / "a.nc", 0, 119),
+        (tmp_path / "b.nc", 60, 99),
+    ]
+    assert repo.dropped[0].path == tmp_path / "b.nc"
+    assert repo.dropped[0].profiles == 60
+
+
+def test_repository_nested_duplicate(tmp_path):
+    """
+    Tests that a file covering the middle of another one splits it into two slices
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 120)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(minutes=20), 20)
+    os.utime(tmp_path / "a.nc", ns=(0, 1_000_000_000))
+    os.utime(tmp_path / "b.nc", ns=(0, 2_000_000_000))
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    assert repo.find_slices(start, start + timedelta(hours=1)) == [
+        (tmp_path / "a.nc", 0, 39),
+        (tmp_path / "b.nc", 0, 19),
+        (tmp_path / "a.nc", 60, 119),
+    ]
+
+    pf = repo.get_pollyxt_file(start, start + timedelta(hours=1))
+    timestamps, _ = pollyxt.polly_dates_to_datetime64(pf.measurement_time)
+    assert timestamps.shape[0] == 120
+    assert np.all(np.diff(timestamps) == np.timedelta64(30, "s"))
+
+
+def test_pollyxt_file_split(tmp_path):
+    """
+    Tests that the parts of a file read the same data as the whole file
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 20)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(minutes=10), 20)
+
+    pf = pollyxt.PollyXTFile.from_slices(
+        [(tmp_path / "a.nc", 5, 19), (tmp_path / "b.nc", 0, 9)],
+        channels=[1, 3],
+        max_points=10,
+    )
+    pf.load(raw_signal=False)
+    assert "raw_signal" not in vars(pf)
+    assert pf.raw_signal_shape == (25, 10, 2)
+
+    parts = list(pf.split(7))
+    assert [first for first, _ in parts] == [0, 7, 14, 21]
+    assert parts[2][1].slices == [
+        (tmp_path / "a.nc", 19, 19),
+        (tmp_path / "b.nc", 0, 5),
+    ]
+    assert np.array_equal(
+        np.concatenate([part.raw_signal for _, part in parts]), pf.raw_signal
+    )
+    assert pf.raw_signal_shape == pf.raw_signal.shape
+
+
+def test_find_raw_files_recursive(tmp_path):
+    """
+    Tests that files in station/year/month directories are only found in recursive mode
+    """
+
+    start = datetime(2021, 1, 1)
+    january = tmp_path / "antikythera" / "2021" / "01"
+    february = tmp_path / "antikythera" / "2021" / "02"
+    january.mkdir(parents=True)
+    february.mkdir(parents=True)
+    create_raw_file(tmp_path / "top.nc", start - timedelta(hours=1), 20)
+    create_raw_file(january / "a.nc", start, 20)
+    create_raw_file(february / "b.nc", start + timedelta(days=31), 20)
+
+    assert pollyxt.find_raw_files(tmp_path) == [tmp_path / "top.nc"]
+    assert pollyxt.find_raw_files(tmp_path, recursive=True) == [
+        january / "a.nc",
+        february / "b.nc",
+        tmp_path / "top.nc",
+    ]
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    assert repo.files == [tmp_path / "top.nc"]
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False, recursive=True)
+    assert len(repo.files) == 3
+    assert repo.find_slices(start + timedelta(days=31), start + timedelta(days=32)) == [
+        (february / "b.nc", 0, 19)
+    ]
+
+
+def test_repository_parallel_index(tmp_path):
+    """
+    Tests that reading the files in several processes builds the same index as reading them in one
+    """
+
+    start = datetime(2021, 1, 1)
+    for i in range(4):
+        create_raw_file(
+            tmp_path / f"{i}.nc",
+            start + timedelta(hours=i),
+            120,
+            calibration=[(10 * i, 10 * i + 5)],
+        )
+
+    serial = pollyxt.PollyXTRepository(tmp_path, use_cache=False, workers=1)
+    parallel = pollyxt.PollyXTRepository(tmp_path, use_cache=False, workers=2)
+
+    assert parallel.files == serial.files
+    assert np.array_equal(parallel.timestamps, serial.timestamps)
+    assert np.array_equal(parallel.file_ids, serial.file_ids)
+    assert np.array_equal(parallel.file_indices, serial.file_indices)
+    assert np.array_equal(parallel.calibration, serial.calibration)
+    assert np.array_equal(parallel.calibration_starts, serial.calibration_starts)
+    assert np.array_equal(parallel.calibration_ends, serial.calibration_ends)
+
+
+def test_find_integration_time():
+    """
+    Tests that the integration time is found from the timestamps, ignoring gaps
+    """
+
+    start = np.datetime64("2021-01-01T00:00:00")
+    timestamps = start + np.array(
+        [0, 60, 120, 180, 3600, 3660, 3720], dtype="timedelta64[s]"
+    )
+    assert pollyxt.find_integration_time(timestamps) == timedelta(seconds=60)
+    assert (
+        pollyxt.find_integration_time(timestamps[:1])
+        == pollyxt.DEFAULT_INTEGRATION_TIME
+    )
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from pollyxt_pipelines.polly_to_scc import pollyxt
+from pollyxt_pipelines.polly_to_scc.prefetch import Prefetcher, ReadTask, Timings
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+
+
+def test_prefetcher_order(tmp_path):
+    """
+    Tests that prefetched data are returned in order and match reading them directly
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 60)
+    create_raw_file(tmp_path / "b.nc", start + timedelta(minutes=30), 60)
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    tasks = []
+    for i in range(6):
+        task_start = start + timedelta(minutes=10 * i)
+        task_end = task_start + timedelta(minutes=10)
+        tasks.append(
+            ReadTask(
+                task_start, task_end, repo.find_slices(task_start, task_end), [0, 2]
+            )
+        )
+
+    timings = Timings()
+    with Prefetcher(
+        iter(tasks), depth=2, pool=repo.pool, timings=timings
+    ) as prefetcher:
+        results = list(prefetcher)
+
+    assert [task for task, _ in results] == tasks
+    for task, pf in results:
+        expected = pollyxt.PollyXTFile.from_slices(task.slices, channels=[0, 2])
+        assert pf.pool is repo.pool
+        assert np.array_equal(pf.raw_signal, expected.raw_signal)
+        assert np.array_equal(pf.raw_signal_swap, expected.raw_signal_swap)
+    assert timings.read > 0
+    repo.close()
+
+
+def test_prefetcher_close_early(tmp_path):
+    """
+    Tests that closing the prefetcher before all tasks are handed over stops the background process
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 60)
+
+    repo = pollyxt.PollyXTRepository(tmp_path, use_cache=False)
+    tasks = [
+        ReadTask(start, start + timedelta(minutes=i), repo.find_slices(start, start))
+        for i in range(5)
+    ]
+
+    with Prefetcher(iter(tasks), depth=3, pool=repo.pool) as prefetcher:
+        for task, _ in prefetcher:
+            break
+        queued = [future for _, future in prefetcher.queue]
+
+    assert task == tasks[0]
+    assert prefetcher.executor is None
+    assert all(future.done() for future in queued)
+    repo.close()
@@ -0,0 +1,242 @@
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+from pollyxt_pipelines.locations import LOCATIONS
+from pollyxt_pipelines.polly_to_scc import pollyxt, scc_netcdf
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+
+
+def test_convert_in_parallel(tmp_path):
+    """
+    Tests that converting with multiple processes creates the same files, in the same order
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 240, channels=12, calibration=[(50, 80)])
+    create_raw_file(tmp_path / "b.nc", start + timedelta(hours=2), 240, channels=12)
+
+    results = {}
+    for jobs in [1, 2]:
+        output_path = tmp_path / f"jobs_{jobs}"
+        output_path.mkdir()
+        with pollyxt.PollyXTRepository(tmp_path, use_cache=False) as repo:
+            results[jobs] = list(
+                scc_netcdf.convert_pollyxt_file(
+                    repo,
+                    output_path,
+                    LOCATIONS["Antikythera"],
+                    timedelta(minutes=30),
+                    scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+                    jobs=jobs,
+                )
+            )
+
+    assert len(results[1]) == 10
+    assert [(id, path.name, s, e) for id, path, s, e in results[1]] == [
+        (id, path.name, s, e) for id, path, s, e in results[2]
+    ]
+    for (_, serial, _, _), (_, parallel, _, _) in zip(results[1], results[2]):
+        with Dataset(serial) as a, Dataset(parallel) as b:
+            assert np.array_equal(a["Raw_Lidar_Data"][:], b["Raw_Lidar_Data"][:])
+
+
+def test_compression_settings(tmp_path):
+    """
+    Tests that the compression settings are applied to the SCC files
+    """
+
+    create_raw_file(tmp_path / "a.nc", datetime(2021, 1, 1), 120, channels=12)
+
+    settings = {
+        "default": scc_netcdf.Compression(),
+        "fast": scc_netcdf.Compression.from_mode("fast")._replace(chunk_profiles=16),
+        "none": scc_netcdf.Compression.from_mode("none"),
+    }
+    for name, compression in settings.items():
+        output_path = tmp_path / name
+        output_path.mkdir()
+        with pollyxt.PollyXTRepository(tmp_path, use_cache=False) as repo:
+            [(_, path, _, _)] = scc_netcdf.convert_pollyxt_file(
+                repo,
+                output_path,
+                LOCATIONS["Antikythera"],
+                timedelta(hours=1),
+                scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+                compression=compression,
+            )
+
+        with Dataset(path) as nc:
+            variable = nc["Raw_Lidar_Data"]
+            filters = variable.filters()
+            if name == "default":
+                assert filters["zlib"] and filters["shuffle"]
+                assert filters["complevel"] == 4
+                assert variable.chunking() == [1, 12, 16]
+            elif name == "fast":
+                assert filters["zlib"] and filters["complevel"] == 1
+                assert variable.chunking() == [16, 12, 16]
+            else:
+                assert not filters["zlib"] and not filters["shuffle"]
+
+
+def test_raw_signal_native_dtype(tmp_path):
+    """
+    Tests that the raw signal is read in its on-disk dtype and only written as float64
+    """
+
+    create_raw_file(tmp_path / "a.nc", datetime(2021, 1, 1), 60, channels=12)
+    pf = pollyxt.PollyXTFile(tmp_path / "a.nc", start=0, end=59)
+
+    assert pf.raw_signal.dtype == np.int32
+    assert np.shares_memory(pf.raw_signal_swap, pf.raw_signal)
+
+    _, path = scc_netcdf.create_scc_netcdf(pf, tmp_path, LOCATIONS["Antikythera"])
+    with Dataset(path) as nc:
+        variable = nc["Raw_Lidar_Data"]
+        assert variable.dtype == np.float64
+        assert np.array_equal(variable[:], pf.raw_signal_swap.astype(np.float64))
+
+
+def test_create_scc_netcdf_allocations(tmp_path):
+    """
+    Tests that writing an SCC file doesn't copy the whole raw signal
+    """
+
+    create_raw_file(
+        tmp_path / "a.nc", datetime(2021, 1, 1), 480, channels=12, calibration=[(5, 9)]
+    )
+    pf = pollyxt.PollyXTFile(tmp_path / "a.nc", start=0, end=479)
+    pf.load()
+
+    tracemalloc.start()
+    _, path = scc_netcdf.create_scc_netcdf(pf, tmp_path, LOCATIONS["Antikythera"])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < pf.raw_signal.nbytes / 2
+    with Dataset(path) as nc:
+        expected = np.delete(pf.raw_signal_swap, range(5, 9), axis=0)
+        assert np.array_equal(nc["Raw_Lidar_Data"][:], expected)
+        assert nc["Laser_Shots"].shape == (476, 12)
+
+
+def test_create_scc_netcdf_streaming(tmp_path):
+    """
+    Tests that streaming the raw signal in parts writes the same file
+    """
+
+    create_raw_file(
+        tmp_path / "a.nc",
+        datetime(2021, 1, 1),
+        100,
+        channels=12,
+        calibration=[(30, 45)],
+    )
+
+    paths = []
+    for stream_profiles in [None, 16]:
+        output_path = tmp_path / str(stream_profiles)
+        output_path.mkdir()
+        pf = pollyxt.PollyXTFile(tmp_path / "a.nc", start=0, end=99)
+        pf.load(raw_signal=stream_profiles is None)
+        _, path = scc_netcdf.create_scc_netcdf(
+            pf, output_path, LOCATIONS["Antikythera"], stream_profiles=stream_profiles
+        )
+        assert ("raw_signal" in vars(pf)) == (stream_profiles is None)
+        paths.append(path)
+
+    with Dataset(paths[0]) as a, Dataset(paths[1]) as b:
+        assert a["Raw_Lidar_Data"].shape == (85, 12, 16)
+        for name in a.variables:
+            assert np.array_equal(a[name][:], b[name][:]), name
+
+
+def test_integration_time(tmp_path):
+    """
+    Tests that intervals and stop times follow the integration time of the raw files
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 60, channels=12, integration_time=60)
+    create_raw_file(
+        tmp_path / "b.nc",
+        start + timedelta(hours=5),
+        60,
+        channels=12,
+        integration_time=60,
+    )
+
+    with pollyxt.PollyXTRepository(tmp_path, use_cache=False) as repo:
+        assert repo.integration_time == timedelta(seconds=60)
+
+        tasks = list(
+            scc_netcdf.conversion_tasks(
+                repo,
+                LOCATIONS["Antikythera"],
+                start,
+                start + timedelta(hours=6),
+                timedelta(minutes=30),
+                calibration=False,
+            )
+        )
+        assert [task.start.hour * 60 + task.start.minute for task in tasks] == [
+            0,
+            30,
+            300,
+            330,
+        ]
+        # Intervals extend one integration time past their end
+        assert tasks[0].slices == [(tmp_path / "a.nc", 0, 31)]
+
+        pf = repo.get_pollyxt_file(start, start + timedelta(minutes=10))
+        _, path = scc_netcdf.create_scc_netcdf(pf, tmp_path, LOCATIONS["Antikythera"])
+
+    with Dataset(path) as nc:
+        duration = nc["Raw_Data_Stop_Time"][:] - nc["Raw_Data_Start_Time"][:]
+        assert np.all(duration == 60)
+
+
+def test_conversion_tasks_same_measurement_id(tmp_path):
+    """
+    Tests that intervals which would write the same file are only converted once
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "a.nc", start, 60, channels=12)
+    create_raw_file(
+        tmp_path / "b.nc", start + timedelta(hours=2, seconds=10), 120, channels=12
+    )
+
+    with pollyxt.PollyXTRepository(tmp_path, use_cache=False) as repo:
+        # The 01:00-02:00 interval only contains the first profile of b.nc, so it would write
+        # the same file as the 02:00-03:00 interval
+        tasks = list(
+            scc_netcdf.conversion_tasks(
+                repo,
+                LOCATIONS["Antikythera"],
+                start,
+                start + timedelta(hours=4),
+                timedelta(hours=1),
+                calibration=False,
+            )
+        )
+        assert [task.start.hour for task in tasks] == [0, 2]
+
+        results = list(
+            scc_netcdf.convert_pollyxt_file(
+                repo,
+                tmp_path,
+                LOCATIONS["Antikythera"],
+                timedelta(hours=1),
+                scc_netcdf.Atmosphere.STANDARD_ATMOSPHERE,
+                jobs=2,
+            )
+        )
+
+    ids = [id for id, _, _, _ in results]
+    assert ids == ["20210101aky0000", "20210101aky0200"]
+    with Dataset(tmp_path / "20210101aky0200.nc") as nc:
+        assert nc["Raw_Lidar_Data"].shape[0] == 120
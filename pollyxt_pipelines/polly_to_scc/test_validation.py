@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from netCDF4 import Dataset
+
+from pollyxt_pipelines.polly_to_scc.test_pollyxt import create_raw_file
+from pollyxt_pipelines.polly_to_scc.validation import validate_files
+
+
+def test_validate_files(tmp_path):
+    """
+    Tests that every bad file is reported, and good files are not
+    """
+
+    start = datetime(2021, 1, 1)
+    create_raw_file(tmp_path / "good_1.nc", start, 10)
+    create_raw_file(tmp_path / "good_2.nc", start, 10)
+    create_raw_file(tmp_path / "bad_time.nc", start, 10)
+    with Dataset(tmp_path / "bad_time.nc", "a") as nc:
+        nc["measurement_time"][3] = [20211399, 0]
+    create_raw_file(tmp_path / "channels.nc", start, 10, channels=5)
+    (tmp_path / "not_netcdf.nc").write_text("Hello")
+
+    paths = sorted(tmp_path.glob("*.nc"))
+    report = validate_files(paths)
+
+    assert report[tmp_path / "good_1.nc"] == []
+    assert report[tmp_path / "good_2.nc"] == []
+    assert "invalid `measurement_time`" in report[tmp_path / "bad_time.nc"][0]
+    assert "5 channels" in report[tmp_path / "channels.nc"][0]
+    assert "Could not open file" in report[tmp_path / "not_netcdf.nc"][0]
@@ -0,0 +1,127 @@
+"""
+Validation of raw PollyXT files
+
+`PollyXTRepository` stops at the first file with a bad `measurement_time`. The functions in this
+module check a whole set of files instead, so every problem can be reported (and fixed) at once.
+Only the small variables and the variable headers are read, `raw_signal` is never loaded.
+"""
+
+from collections import Counter
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from netCDF4 import Dataset
+
+from pollyxt_pipelines import utils
+from pollyxt_pipelines.polly_to_scc.pollyxt import polly_dates_to_datetime64
+from pollyxt_pipelines.polly_to_scc.compressed import ScratchCache, local_raw_path
+
+REQUIRED_VARIABLES = {
+    "measurement_time": 2,
+    "raw_signal": 3,
+    "measurement_shots": 2,
+    "depol_cal_angle": 1,
+    "zenithangle": 1,
+    "location_coordinates": 1,
+}
+"""The variables that are read during conversion and their number of dimensions"""
+
+
+def validate_file(
+    path: Path, scratch: Optional[ScratchCache] = None
+) -> Tuple[List[str], Optional[Tuple[int, int]]]:
+    """
+    Checks a raw PollyXT file for problems that would stop (or corrupt) the conversion.
+
+    Parameters:
+        path: The file to check
+        scratch: Where to decompress the file, if it's compressed
+
+    Returns:
+        A tuple containing the list of problems (empty if the file is fine) and the (points,
+        channels) of the file, which is `None` if they can't be read.
+    """
+
+    try:
+        nc = Dataset(local_raw_path(path, scratch), "r")
+    except OSError as ex:
+        return [f"Could not open file: {ex}"], None
+
+    problems = []
+    shape = None
+    with nc:
+        # Check that every variable exists and has the expected dimensions
+        for name, ndim in REQUIRED_VARIABLES.items():
+            if name not in nc.variables:
+                problems.append(f"Missing variable `{name}`")
+            elif nc[name].ndim != ndim:
+                problems.append(
+                    f"Variable `{name}` has {nc[name].ndim} dimensions instead of {ndim}"
+                )
+        if len(problems) > 0:
+            return problems, None
+
+        # All per-profile variables must have the same number of profiles and channels
+        profiles = nc["measurement_time"].shape[0]
+        if profiles == 0:
+            problems.append("File has no profiles")
+        if nc["measurement_time"].shape[1] != 2:
+            problems.append("Variable `measurement_time` must have two columns")
+        for name in ["raw_signal", "measurement_shots", "depol_cal_angle"]:
+            if nc[name].shape[0] != profiles:
+                problems.append(
+                    f"Variable `{name}` has {nc[name].shape[0]} profiles instead of {profiles}"
+                )
+        shape = nc["raw_signal"].shape[1:]
+        if nc["measurement_shots"].shape[1] != shape[1]:
+            problems.append(
+                f"Variable `measurement_shots` has {nc['measurement_shots'].shape[1]} channels instead of {shape[1]}"
+            )
+
+        # Check the timestamps
+        if len(problems) == 0:
+            measurement_time = nc["measurement_time"][:]
+            _, valid = polly_dates_to_datetime64(measurement_time)
+            if not np.all(valid):
+                bad_value = measurement_time[np.argmin(valid)]
+                problems.append(
+                    f"{np.count_nonzero(~valid)} invalid `measurement_time` values (first: {bad_value.tolist()})"
+                )
+
+    return problems, shape
+
+
+def validate_files(
+    paths: Sequence[Path], workers: int = 1, scratch: Optional[ScratchCache] = None
+) -> Dict[Path, List[str]]:
+    """
+    Checks a set of raw files using `validate_file()`. Additionally, files whose number of points or
+    channels differs from the majority of the set are reported, since they can't be merged with the
+    other files.
+
+    Parameters:
+        paths: The files to check
+        workers: How many files to check at the same time (see `utils.parallel_map()`)
+        scratch: Where to decompress compressed files
+
+    Returns:
+        A dictionary with the problems of each file. Files without problems have an empty list.
+    """
+
+    results = utils.parallel_map(
+        partial(validate_file, scratch=scratch), paths, workers
+    )
+
+    report = {path: problems for path, (problems, _) in zip(paths, results)}
+    shapes = Counter(shape for _, shape in results if shape is not None)
+    if len(shapes) > 1:
+        (points, channels), _ = shapes.most_common(1)[0]
+        for path, (_, shape) in zip(paths, results):
+            if shape is not None and shape != (points, channels):
+                report[path].append(
+                    f"File has {shape[0]} points and {shape[1]} channels, while most files have {points} and {channels}"
+                )
+
+    return report
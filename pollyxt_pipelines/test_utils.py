@@ -2,7 +2,7 @@ from datetime import datetime
 
 import pytest
 
-from pollyxt_pipelines.utils import date_option_to_datetime
+from pollyxt_pipelines.utils import atomic_write, date_option_to_datetime
 
 
 class TestDateOptionToDatetime:
@@ -85,3 +85,21 @@ class TestDateOptionToDatetime:
         # Bad minute value (:70)
         with pytest.raises(ValueError):
             date_option_to_datetime(measurement_start, "XX:70")
+
+
+def test_atomic_write(tmp_path):
+    """
+    Tests that a failed write leaves the previous file in place and no temporary files behind
+    """
+
+    path = tmp_path / "data.json"
+    with atomic_write(path) as file:
+        file.write("first")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as file:
+            file.write("second")
+            raise RuntimeError()
+
+    assert path.read_text() == "first"
+    assert list(tmp_path.iterdir()) == [path]
@@ -1,7 +1,11 @@
 """Various helper functions that fit nowhere"""
 
-from typing import List
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable, Iterable, Iterator, List, Sequence
 from datetime import datetime, timedelta
+import os
 import re
 
 
@@ -42,6 +46,61 @@ def option_to_bool(x: bool, absence_value: bool):
     return x
 
 
+def parallel_map(function: Callable, items: Sequence, workers: int) -> List:
+    """
+    Applies `function` to every item using a pool of `workers` processes and returns the results
+    in the same order as `items`. If `workers` is 1 (or there is only one item), everything runs in
+    the current process instead.
+
+    `function` must be a top-level function, so it can be sent to the worker processes.
+    """
+
+    if workers is None or workers <= 1 or len(items) <= 1:
+        return [function(x) for x in items]
+
+    workers = min(workers, len(items))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items))
+
+
+def shutdown_pool(executor: Executor, futures: Iterable[Future]):
+    """
+    Cancels the given futures that haven't started yet and shuts the executor down, waiting for the
+    running ones. This is `executor.shutdown(cancel_futures=True)`, which needs Python 3.9.
+    """
+
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=True)
+
+
+@contextmanager
+def atomic_write(path: Path, mode: str = "w") -> Iterator[IO]:
+    """
+    Opens a temporary file next to `path` for writing. When the block ends without errors, the
+    temporary file replaces `path`, otherwise it is deleted. Readers never see a partially written
+    file, and since the temporary name is unique per process, concurrent writers don't mix their
+    output (the last one to finish wins).
+
+        with atomic_write(path) as file:
+            file.write(...)
+
+    Raises:
+        OSError: When the file can't be written
+    """
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    finally:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
 def ints_to_strs(arr: List[int]) -> List[str]:
     """
     Convert a list of `int` to a list of `str`.